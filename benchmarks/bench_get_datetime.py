@@ -0,0 +1,59 @@
+"""Compare `get_datetime`, which parses unique dates and times per format, against parsing a
+concatenated date and time string.
+
+Usage: python benchmarks/bench_get_datetime.py [n_rows]
+"""
+from __future__ import print_function
+import sys
+import time
+import numpy as np
+import pandas as pd
+from lovelyrita.clean import get_datetime, infer_datetime_format
+
+
+def get_datetime_concat(dataframe):
+    """The original implementation, which infers one format from the first row"""
+    datetimes = dataframe['ticket_issue_date'].str.cat(dataframe['ticket_issue_time'], sep=' ')
+    datetime_format = infer_datetime_format(datetimes)
+    return pd.to_datetime(datetimes, format=datetime_format)
+
+
+def make_citations(n_rows, seed=0):
+    """Dates over two years in '%m/%d/%y' and times in '%H:%M' and '%H:%M:%S', mixed by row"""
+    random = np.random.RandomState(seed)
+    start = np.datetime64('2017-01-01T00:00')
+    datetimes = pd.Series(start + random.randint(0, 2 * 365 * 24 * 60, n_rows).astype('m8[m]'))
+    seconds = random.rand(n_rows) < 0.5
+    datetimes[seconds] += pd.to_timedelta(random.randint(0, 60, seconds.sum()), unit='s')
+
+    dates = datetimes.dt.strftime('%m/%d/%y')
+    times = datetimes.dt.strftime('%H:%M')
+    times[seconds] = datetimes[seconds].dt.strftime('%H:%M:%S')
+    return pd.DataFrame({'ticket_issue_date': dates, 'ticket_issue_time': times}), datetimes
+
+
+def main(n_rows=10000000):
+    dataframe, expected = make_citations(n_rows)
+    print('{} rows, e.g. {} {}'.format(n_rows, *dataframe.iloc[0]))
+
+    start = time.time()
+    datetimes = get_datetime(dataframe)
+    unique_seconds = time.time() - start
+    print('unique, per format: {:.3f} s'.format(unique_seconds))
+    print('correct: {}'.format((datetimes.values == expected.values).all()))
+
+    # The concatenated strings mix formats, so only rows with seconds can be parsed with one
+    # format; time that subset to compare like with like
+    subset = dataframe[dataframe['ticket_issue_time'].str.len() == 8]
+    start = time.time()
+    get_datetime_concat(subset)
+    concat_seconds = time.time() - start
+    start = time.time()
+    get_datetime(subset)
+    subset_seconds = time.time() - start
+    print('{} rows with seconds: concatenated {:.3f} s, unique {:.3f} s ({:.0f}x faster)'.format(
+        len(subset), concat_seconds, subset_seconds, concat_seconds / subset_seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
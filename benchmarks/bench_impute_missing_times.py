@@ -0,0 +1,75 @@
+"""Compare the vectorized `impute_missing_times` against the original per-gap loop.
+
+Usage: python benchmarks/bench_impute_missing_times.py [n_rows] [null_fraction]
+"""
+from __future__ import print_function
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from lovelyrita.clean import impute_missing_times
+
+
+def impute_missing_times_loop(datetimes):
+    """The original implementation, which converts each gap through local time"""
+    n_rows = len(datetimes)
+
+    null_indices = np.flatnonzero(datetimes.isnull().values)
+
+    if len(null_indices) > 0:
+        valid_starts = null_indices[1:][np.diff(null_indices) > 1]
+        if null_indices[0] > 0:
+            valid_starts = np.r_[null_indices[0], valid_starts]
+        valid_starts -= 1
+
+        valid_ends = null_indices[:-1][np.diff(null_indices) > 1]
+        if null_indices[-1] < (n_rows - 1):
+            valid_ends = np.r_[valid_ends, null_indices[-1]]
+        valid_ends += 1
+
+        for valid_start, valid_end in zip(valid_starts, valid_ends):
+            start_datetime = datetimes.iloc[valid_start]
+            end_datetime = datetimes.iloc[valid_end]
+
+            start_seconds = time.mktime(start_datetime.timetuple())
+            end_seconds = time.mktime(end_datetime.timetuple())
+
+            n = valid_end - valid_start + 1
+            interpolated_seconds = np.linspace(start_seconds, end_seconds, n)
+            interpolated_datetimes = [datetime.fromtimestamp(s) for s in interpolated_seconds]
+            for i, j in enumerate(range(valid_start + 1, valid_end)):
+                datetimes.iloc[j] = interpolated_datetimes[i]
+
+
+def make_datetimes(n_rows, null_fraction, seed=0):
+    """Sorted ticket times with a random fraction of missing values, the first and last valid"""
+    random = np.random.RandomState(seed)
+    seconds = np.sort(random.randint(0, 3 * 365 * 24 * 3600, n_rows))
+    datetimes = pd.Series(pd.Timestamp('2015-01-01') + pd.to_timedelta(seconds, unit='s'))
+    null = random.rand(n_rows) < null_fraction
+    null[[0, -1]] = False
+    datetimes[null] = pd.NaT
+    return datetimes
+
+
+def main(n_rows=100000, null_fraction=0.05):
+    datetimes = make_datetimes(n_rows, null_fraction)
+    print('{} rows, {} missing'.format(n_rows, datetimes.isnull().sum()))
+
+    vectorized = datetimes.copy()
+    start = time.time()
+    impute_missing_times(vectorized)
+    vectorized_seconds = time.time() - start
+    print('vectorized: {:.3f} s'.format(vectorized_seconds))
+
+    loop = datetimes.copy()
+    start = time.time()
+    impute_missing_times_loop(loop)
+    loop_seconds = time.time() - start
+    print('loop:       {:.3f} s ({:.0f}x slower)'.format(loop_seconds,
+                                                        loop_seconds / vectorized_seconds))
+
+
+if __name__ == '__main__':
+    main(*[f(a) for f, a in zip((int, float), sys.argv[1:])])
@@ -0,0 +1,70 @@
+"""Compare the vectorized prefix filter in `parse_P123_main_street` against `iterrows`.
+
+Usage: python benchmarks/bench_parse_P123_main_street.py [n_rows]
+"""
+from __future__ import print_function
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+from lovelyrita.addresses import parse_P123_main_street
+
+
+STREET_NAMES = ['PARK STREET', 'BROADWAY', 'TELEGRAPH AVE', 'GRAND AVE', 'LAKESHORE AVE',
+                'MACARTHUR BLVD', 'PIEDMONT AVE', 'COLLEGE AVE', 'BROADWAY TERRACE', 'MARKET ST']
+
+
+def parse_P123_main_street_iterrows(addresses):
+    """The original implementation, which filters prefixes with iterrows"""
+    patt = re.compile(r'^(?P<prefix>[A-Z]+)\-?(?P<street_number>\d+[\-\W]?\d?) '
+                      r'(?P<street_name>[\w\d\s]+)')
+    street = addresses.str.extract(patt, expand=True)
+    street.dropna(inplace=True)
+
+    drop_indices = []
+    for i, s in street.iterrows():
+        street_words = s.street_name.split(' ')
+        drop = True
+        for street_word in street_words:
+            if street_word.startswith(s.prefix[0]):
+                drop = False
+        if drop:
+            drop_indices.append(i)
+
+    street.drop(drop_indices, inplace=True)
+
+    return street
+
+
+def make_addresses(n_rows, seed=0):
+    """Lot addresses such as P123-1 PARK STREET, about half with a matching prefix"""
+    random = np.random.RandomState(seed)
+    names = np.array(STREET_NAMES)[random.randint(0, len(STREET_NAMES), n_rows)]
+    prefixes = np.array(list('ABCGLMPT'))[random.randint(0, 8, n_rows)]
+    numbers = random.randint(1, 999, n_rows).astype(str)
+    suffixes = random.randint(1, 9, n_rows).astype(str)
+    return pd.Series(prefixes).str.cat([numbers, suffixes, names], sep='-').str.replace(
+        r'^(\w+)-(\d+)-(\d)-', r'\1\2-\3 ', regex=True)
+
+
+def main(n_rows=1000000):
+    addresses = make_addresses(n_rows)
+    print('{} addresses, e.g. {}'.format(n_rows, addresses.iloc[0]))
+
+    start = time.time()
+    vectorized = parse_P123_main_street(addresses)
+    vectorized_seconds = time.time() - start
+    print('vectorized: {:.3f} s'.format(vectorized_seconds))
+
+    start = time.time()
+    iterrows = parse_P123_main_street_iterrows(addresses)
+    iterrows_seconds = time.time() - start
+    print('iterrows:   {:.3f} s ({:.0f}x slower)'.format(iterrows_seconds,
+                                                        iterrows_seconds / vectorized_seconds))
+
+    print('identical output: {}'.format(vectorized.equals(iterrows)))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,180 @@
+"""Generate synthetic raw citation data for benchmarks.
+
+The data has the quirks of the real extracts: a few streets account for most citations, some
+streets are voided (VOID123 MAIN ST), some are parking lot spaces (P12-1 PARK ST), dollar
+amounts are text, some times are missing, and dates and times come in each of the formats in
+`DATETIME_FORMATS`.
+
+Usage: python benchmarks/citations.py out_path [n_rows] [seed]
+"""
+from __future__ import print_function
+import sys
+import numpy as np
+import pandas as pd
+from lovelyrita.config import DATETIME_FORMATS
+
+
+STREET_NAMES = ['BROADWAY', 'TELEGRAPH', 'GRAND', 'LAKESHORE', 'MACARTHUR', 'PIEDMONT',
+                'COLLEGE', 'SAN PABLO', 'INTERNATIONAL', 'FOOTHILL', 'MARKET', 'WEBSTER',
+                'FRANKLIN', 'HARRISON', 'ALICE', 'JACKSON', 'MADISON', 'OAK', 'CLAY',
+                'WASHINGTON', 'JEFFERSON', 'MARTIN LUTHER KING JR', 'PARK', 'FRUITVALE',
+                'HIGH', 'SHATTUCK', 'CLAREMONT', 'LAKESIDE', 'HARRISON', 'EMBARCADERO']
+STREET_SUFFIXES = ['ST', 'AVE', 'BLVD', 'WAY', 'DR']
+NUMBERED_STREETS = ['{} ST'.format(n) for n in
+                    ['2ND', '3RD', '4TH', '5TH', '6TH', '7TH', '8TH', '9TH', '10TH', '11TH',
+                     '12TH', '13TH', '14TH', '15TH', '17TH', '19TH', '20TH', '40TH', '51ST']]
+LOTS = ['CLOT CITY CENTER LOT', 'MLOT MONTCLAIR LOT', 'DLOT DIMOND LOT', 'JLOT JACK LONDON LOT']
+
+VOID_PREFIXES = ['VOID', 'ZVOID', 'VOIDZ']
+FINE_AMOUNTS = ['$25.00', '$45.00', '$58.00', '$65.00', '$83.00', '$110.00', '$1,234.00',
+                '-$45.00']
+FINE_WEIGHTS = [0.2, 0.25, 0.25, 0.15, 0.08, 0.05, 0.01, 0.01]
+VIOLATIONS = [('10.36.140', 'METER EXPIRED'), ('10.28.240', 'STREET CLEANING'),
+              ('10.40.030', 'PARKING OVER TIME LIMIT'), ('22500E', 'BLOCKING DRIVEWAY'),
+              ('10.36.020', 'RED ZONE'), ('22507.8A', 'DISABLED PARKING'),
+              ('10.28.160', 'PARKED ON SIDEWALK'), ('5204A', 'EXPIRED REGISTRATION')]
+STATES = ['CA', 'NV', 'OR', 'WA', 'TX', 'AZ']
+
+START = np.datetime64('2017-01-01T00:00:00', 's')
+N_DAYS = 2 * 365
+
+
+def make_streets(n_streets=5000, seed=0):
+    """Make a pool of street addresses, most common first
+
+    Returns
+    -------
+    A numpy array of str
+    """
+    random = np.random.RandomState(seed)
+    names = np.array(['{} {}'.format(name, suffix) for name in STREET_NAMES
+                      for suffix in STREET_SUFFIXES] + NUMBERED_STREETS)
+
+    kinds = random.choice(['number', 'block', 'lot space', 'hash', 'lot'], n_streets,
+                          p=[0.8, 0.08, 0.07, 0.03, 0.02])
+    streets = []
+    for kind, name in zip(kinds, names[random.randint(0, len(names), n_streets)]):
+        number = random.randint(1, 99) * 100 + random.randint(0, 99)
+        if kind == 'number':
+            streets.append('{} {}'.format(number, name))
+        elif kind == 'block':
+            streets.append('{} BLK {}'.format(random.choice(['ONE', 'TWO', number]), name))
+        elif kind == 'lot space':
+            # about half of the lot prefixes match the initial of a word of the street
+            initial = random.choice([name[0], 'X'])
+            streets.append('{}{}-{} {}'.format(initial, random.randint(1, 99),
+                                               random.randint(1, 9), name))
+        elif kind == 'hash':
+            streets.append('#{} {}'.format(number, name))
+        else:
+            streets.append(LOTS[random.randint(0, len(LOTS))])
+
+    # some streets have stray spaces around them
+    padded = random.rand(n_streets) < 0.05
+    return np.array([' {} '.format(s) if pad else s for s, pad in zip(streets, padded)],
+                    dtype=object)
+
+
+def _lookup(values, formats):
+    """Format each value in each format, as an array of shape (len(formats), len(values))"""
+    return np.array([pd.Series(values).dt.strftime(f).values for f in formats], dtype=object)
+
+
+def make_citations(n_rows, seed=0, first_ticket=0, start_day=0, end_day=N_DAYS,
+                   streets=None):
+    """Make a DataFrame of raw citations, in the format read by `lovelyrita.data.read_data`
+
+    Citations are in order of time, between `start_day` and `end_day` days after 2017-01-01.
+
+    Parameters
+    ----------
+    n_rows : int
+    seed : int
+    first_ticket : int
+        Ticket number of the first citation
+    start_day, end_day : int
+    streets : numpy.ndarray
+        Pool of streets, from `make_streets`
+
+    Returns
+    -------
+    A pandas.DataFrame
+    """
+    random = np.random.RandomState(seed)
+    if streets is None:
+        streets = make_streets()
+
+    # a few streets get most of the citations
+    weights = 1. / np.arange(1, len(streets) + 1) ** 1.1
+    street_codes = random.choice(len(streets), n_rows, p=weights / weights.sum())
+    void = random.rand(n_rows) < 0.03
+    void_codes = random.randint(0, len(VOID_PREFIXES), n_rows)
+    pool = np.concatenate([streets] + [prefix + streets for prefix in VOID_PREFIXES])
+    street = pool[np.where(void, street_codes + len(streets) * (void_codes + 1), street_codes)]
+
+    # dates and times are formatted through lookup tables of every day and second
+    seconds = np.sort(random.randint(start_day * 86400, end_day * 86400, n_rows))
+    date_formats, time_formats = zip(*[f.split(' ', 1) for f in DATETIME_FORMATS])
+    format_codes = random.choice(len(DATETIME_FORMATS), n_rows, p=[0.75, 0.2, 0.05])
+    days = START + np.arange(N_DAYS).astype('m8[D]')
+    times = START + np.arange(86400).astype('m8[s]')
+    date_table = _lookup(days, sorted(set(date_formats)))
+    time_table = _lookup(times, sorted(set(time_formats)))
+    date_rows = np.array([sorted(set(date_formats)).index(f) for f in date_formats])
+    time_rows = np.array([sorted(set(time_formats)).index(f) for f in time_formats])
+    ticket_issue_date = date_table[date_rows[format_codes], seconds // 86400]
+    ticket_issue_time = time_table[time_rows[format_codes], seconds % 86400]
+    ticket_issue_time[random.rand(n_rows) < 0.02] = None
+
+    ticket_number = np.arange(first_ticket, first_ticket + n_rows).astype(str).astype(object)
+    ticket_number[random.rand(n_rows) < 0.001] = None
+
+    fine_amount = np.array(FINE_AMOUNTS, dtype=object)[
+        random.choice(len(FINE_AMOUNTS), n_rows, p=FINE_WEIGHTS)]
+    fine_amount[random.rand(n_rows) < 0.01] = None
+
+    violation_codes = random.randint(0, len(VIOLATIONS), n_rows)
+    codes, descriptions = [np.array(v, dtype=object) for v in zip(*VIOLATIONS)]
+
+    located = random.rand(n_rows) < 0.7
+    latitude = np.where(located, 37.70 + 0.15 * random.rand(n_rows), 0.).round(6)
+    longitude = np.where(located, -122.30 + 0.15 * random.rand(n_rows), 0.).round(6)
+
+    return pd.DataFrame({
+        'ticket_number': ticket_number,
+        'ticket_issue_date': ticket_issue_date,
+        'ticket_issue_time': ticket_issue_time,
+        'street': street,
+        'violation_external_code': codes[violation_codes],
+        'violation_desc_long': descriptions[violation_codes],
+        'state': np.array(STATES, dtype=object)[
+            random.choice(len(STATES), n_rows, p=[0.95, 0.01, 0.01, 0.01, 0.01, 0.01])],
+        'city': 'OAKLAND',
+        'badge_number': random.randint(1000, 1300, n_rows).astype(str),
+        'fine_amount': fine_amount,
+        '[latitude]': latitude,
+        '[longitude]': longitude})
+
+
+def write_citations(path, n_rows, seed=0, chunksize=1000000):
+    """Write raw citations to a csv file, generating at most `chunksize` rows at a time
+
+    Parameters
+    ----------
+    path : str
+    n_rows : int
+    seed : int
+    chunksize : int
+    """
+    streets = make_streets(seed=seed)
+    n_chunks = max(1, -(-n_rows // chunksize))
+    for i in range(n_chunks):
+        start, stop = i * n_rows // n_chunks, (i + 1) * n_rows // n_chunks
+        chunk = make_citations(stop - start, seed=seed + i, first_ticket=start,
+                               start_day=i * N_DAYS // n_chunks,
+                               end_day=(i + 1) * N_DAYS // n_chunks, streets=streets)
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+
+
+if __name__ == '__main__':
+    write_citations(sys.argv[1], *[int(a) for a in sys.argv[2:]])
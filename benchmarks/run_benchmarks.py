@@ -0,0 +1,170 @@
+"""Time the main steps of the pipeline on synthetic citations of several sizes.
+
+`read_data`, each stage of `clean`, `parse_addresses`, `to_geodataframe` and
+`geocode_citations` are timed, and their peak memory is traced by `tracemalloc` in a second
+run, since tracing slows them down. Geocoding uses a local stub, so only the overhead of
+`geocode_citations` is measured. Results are written to <results>/<label>.json, where the
+results directory defaults to benchmarks/results, which is not tracked by git, and the label
+defaults to the output of `git describe`. Two results files can be compared.
+
+Usage: python benchmarks/run_benchmarks.py [--sizes 100000 1000000 10000000] [--label LABEL]
+                                           [--results DIRECTORY]
+       python benchmarks/run_benchmarks.py --compare results/old.json results/new.json
+"""
+from __future__ import print_function, division
+import os
+import sys
+import json
+import shutil
+import hashlib
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+import pandas as pd
+from lovelyrita.addresses import parse_addresses
+from lovelyrita.clean import clean
+from lovelyrita.data import read_data, to_geodataframe
+from lovelyrita.geocode import geocode_citations
+from lovelyrita.profiler import Profiler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from citations import write_citations  # noqa: E402
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class StubGeocoder(object):
+    """A local geocoder that returns a made up location for each address"""
+    columns = ['lat', 'lng', 'place_id']
+
+    def geocode_many(self, addresses):
+        results = []
+        for address in addresses:
+            digest = int(hashlib.md5(address.encode('utf-8')).hexdigest()[:8], 16)
+            results.append((37.7 + (digest % 1000) / 1e4, -122.3 + (digest // 1000 % 1000) / 1e4,
+                            'stub-{}'.format(digest)))
+        return results
+
+
+def benchmark(path, trace_memory=False):
+    """Run each step on the raw citations in a csv file
+
+    Returns
+    -------
+    A list of dicts, one per step, from `Profiler.report`
+    """
+    profiler = Profiler(trace_memory=trace_memory)
+    with profiler.stage('read_data') as stage:
+        citations = read_data(path)
+        stage['rows_out'] = len(citations)
+
+    citations = clean(citations, profiler=profiler)
+
+    with profiler.stage('parse_addresses', citations):
+        parse_addresses(citations['street'])
+
+    with profiler.stage('to_geodataframe', citations) as stage:
+        stage['rows_out'] = len(to_geodataframe(citations, copy=True))
+
+    with profiler.stage('geocode_citations', citations):
+        geocode_citations(citations, StubGeocoder(), progress=lambda n_done, n_total: None)
+
+    return profiler.report()
+
+
+def benchmark_size(n_rows, directory, trace_memory=True, seed=0):
+    """Time each step on `n_rows` synthetic citations and, in a second run, trace its memory
+
+    Tracing memory slows down the steps, so the times are taken from a run without it.
+    """
+    path = os.path.join(directory, 'citations-{}.csv'.format(n_rows))
+    print('... Generating {} citations'.format(n_rows))
+    write_citations(path, n_rows, seed=seed)
+
+    print('... Timing')
+    report = benchmark(path)
+    if trace_memory:
+        print('... Tracing memory')
+        peak_memory = {stage['stage']: stage['peak_memory']
+                       for stage in benchmark(path, trace_memory=True)}
+        for stage in report:
+            stage['peak_memory'] = peak_memory[stage['stage']]
+
+    os.remove(path)
+    return report
+
+
+def get_label():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+
+
+def to_dataframe(results):
+    """Flatten a results file into a table indexed by size and step"""
+    rows = [dict(stage, n_rows=int(n_rows)) for n_rows, stages in results['sizes'].items()
+            for stage in stages]
+    return pd.DataFrame(rows).set_index(['n_rows', 'stage'])
+
+
+def compare(old_path, new_path):
+    """Print the time and peak memory of two results files, and their ratio"""
+    with open(old_path) as f:
+        old = to_dataframe(json.load(f))
+    with open(new_path) as f:
+        new = to_dataframe(json.load(f))
+
+    table = old[['seconds', 'peak_memory']].join(new[['seconds', 'peak_memory']],
+                                                 lsuffix='_old', rsuffix='_new', how='outer')
+    table['time ratio'] = table['seconds_new'] / table['seconds_old']
+    table['memory ratio'] = table['peak_memory_new'] / table['peak_memory_old']
+    print(table.to_string(float_format='{:.3f}'.format))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000, 10000000])
+    parser.add_argument('--label', default=None,
+                        help="""Name of the results file. Defaults to `git describe`.""")
+    parser.add_argument('--results', default=RESULTS_DIRECTORY,
+                        help="""Directory the results file is written to""")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="""Only time the steps, without the run that traces memory""")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), default=None)
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+
+    label = args.label or get_label()
+    results = {'label': label,
+               'date': datetime.datetime.now().isoformat(),
+               'python': platform.python_version(),
+               'pandas': pd.__version__,
+               'trace_memory': not args.no_memory,
+               'sizes': {}}
+
+    directory = tempfile.mkdtemp()
+    try:
+        for n_rows in args.sizes:
+            results['sizes'][n_rows] = benchmark_size(n_rows, directory,
+                                                      trace_memory=not args.no_memory)
+            print(to_dataframe(results).loc[n_rows].to_string(float_format='{:.3f}'.format))
+    finally:
+        shutil.rmtree(directory)
+
+    if not os.path.exists(args.results):
+        os.makedirs(args.results)
+    path = os.path.join(args.results, '{}.json'.format(label))
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('... Wrote results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
 from __future__ import print_function
+import os
+import time
 import argparse
 
-from lovelyrita.clean import clean
-from lovelyrita.data import read_data, summarize, write_shapefile, to_geodataframe
+from lovelyrita.clean import clean, compact
+from lovelyrita.schema import CATEGORICAL_COLUMNS
+from lovelyrita.profiler import Profiler
+from lovelyrita.data import (read_data, iter_data, write_chunks, summarize, load_data,
+                             write_data, get_file_format)
+
+DEFAULT_CHUNKSIZE = 100000
 
 
 def parse_arguments():
@@ -13,56 +20,242 @@ def parse_arguments():
     clean = subcommand.add_parser('clean', help="""Clean raw data file""")
     clean.set_defaults(command_name='clean')
     clean.add_argument('in_path', help="""File path to the raw data""")
-    clean.add_argument('out_path', help="""Output path""")
+    clean.add_argument('out_path', help="""Output path (.csv, .parquet, .feather, ...)""")
+    clean.add_argument('--chunksize', type=int, default=None,
+                       help="""Read, clean and write the data this many rows at a time""")
+    clean.add_argument('--jobs', type=int, default=None,
+                       help="""Number of worker processes used to clean the data""")
+    clean.add_argument('--incremental', action='store_true',
+                       help="""Treat the output path as a store directory, partitioned by month,
+                               and clean and add only citations not already in it""")
+    clean.add_argument('--profile', action='store_true',
+                       help="""Print the time, rows and peak memory of each cleaning stage""")
+    clean.add_argument('--profile-output', default=None,
+                       help="""Write the profile of the cleaning stages to this JSON file""")
 
     summarize = subcommand.add_parser('summarize', help=("""Generate a column summarize from 
                                                             raw data file"""))
     summarize.set_defaults(command_name='summarize')
     summarize.add_argument('in_path', help="""Location of the raw data.""")
+    summarize.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                           help="""Read the data this many rows at a time""")
+    summarize.add_argument('--approximate', action='store_true',
+                           help="""Estimate unique counts, using a fixed amount of memory""")
+    add_month_arguments(summarize)
 
     preprocess = subcommand.add_parser('convert', help=("""Convert between two file types"""))
     preprocess.set_defaults(command_name='convert')
     preprocess.add_argument('in_path', help="""Location of the raw data.""")
-    preprocess.add_argument('out_path', help="""Where to store the output data""")
+    preprocess.add_argument('out_path', help="""Where to store the output data. The format is
+                                                chosen from the extension: .csv, .parquet,
+                                                .geoparquet, .feather or .shp""")
     preprocess.add_argument('--clean', action='store_true',
                             help="""Clean the input data before conversion""")
+    preprocess.add_argument('--jobs', type=int, default=None,
+                            help="""Number of worker processes used to load and clean the data""")
+    add_month_arguments(preprocess)
+
+    geocode = subcommand.add_parser('geocode', help="""Geocode the addresses in a cleaned data
+                                                       file""")
+    geocode.set_defaults(command_name='geocode')
+    geocode.add_argument('in_path', help="""Location of the cleaned data.""")
+    geocode.add_argument('out_path', help="""Where to store the geocoded data""")
+    geocode.add_argument('--geocoder', default='postgis',
+                         choices=['postgis', 'postgis-pool', 'google', 'google-async',
+                                  'gazetteer'],
+                         help="""Geocoding backend""")
+    geocode.add_argument('--gazetteer', default=None,
+                         help="""File of address points used by the gazetteer geocoder, with
+                                 columns street_number, street_name, latitude and longitude""")
+    geocode.add_argument('--fallback', default=None,
+                         choices=['postgis', 'postgis-pool', 'google', 'google-async'],
+                         help="""Backend for addresses the gazetteer geocoder does not find""")
+    geocode.add_argument('--interpolate', action='store_true',
+                         help="""Only geocode the lowest and highest house numbers on each block
+                                 face, and interpolate the others""")
+    geocode.add_argument('--block-size', type=int, default=100,
+                         help="""Number of house numbers in a block, used with --interpolate""")
+    geocode.add_argument('--checkpoint', default=None,
+                         help="""Where to store results as they are completed. Defaults to the
+                                 output path with a .checkpoint extension, or .blocks.checkpoint
+                                 with --interpolate.""")
+    geocode.add_argument('--resume', action='store_true',
+                         help="""Skip citations already in the checkpoint file""")
+    geocode.add_argument('--batch-size', type=int, default=1000,
+                         help="""Number of unique addresses geocoded between checkpoints""")
+    geocode.add_argument('--cache', action='store_true',
+                         help="""Look up and save results in the persistent geocode cache""")
 
     args = parser.parse_args()
     return args
 
 
+def add_month_arguments(parser):
+    parser.add_argument('--start', default=None,
+                        help="""When reading a store, the first month to read, e.g., 2018-01""")
+    parser.add_argument('--end', default=None,
+                        help="""When reading a store, the last month to read, e.g., 2018-12""")
+
+
+def iter_raw_or_processed(path, chunksize, start=None, end=None):
+    """Read a raw csv with `iter_data`, a store with `iter_store`, or a file in any other format
+    with `load_data`, in chunks
+    """
+    if os.path.isdir(path):
+        from lovelyrita.store import iter_store
+        return iter_store(path, chunksize, start=start, end=end)
+    if get_file_format(path) == 'csv':
+        return iter_data(path, chunksize)
+    return load_data(path, chunksize=chunksize)
+
+
+def get_geocoder(name, cache=None, gazetteer=None, fallback=None):
+    """Create a geocoder from its command line name
+    """
+    from lovelyrita import geocode
+
+    if name == 'gazetteer':
+        if gazetteer is None:
+            raise ValueError('The gazetteer geocoder needs a --gazetteer file')
+        if fallback is not None:
+            fallback = get_geocoder(fallback, cache=cache)
+        return geocode.GazetteerGeocoder(geocode.load_gazetteer(gazetteer), fallback=fallback)
+
+    geocoders = {'postgis': geocode.PostGISGeocoder,
+                 'postgis-pool': geocode.PooledPostGISGeocoder,
+                 'google': geocode.Geocoder,
+                 'google-async': geocode.AsyncGeocoder}
+    return geocoders[name](cache=cache)
+
+
+def get_profiler(args):
+    """Create a profiler if one was requested on the command line
+    """
+    if args.profile or args.profile_output is not None:
+        return Profiler()
+
+
+def report_profile(profiler, args):
+    """Print the profile table and write the JSON report, as requested on the command line
+    """
+    if profiler is None or not profiler.enabled:
+        return
+    if args.profile:
+        print(profiler.to_dataframe().to_string(float_format='{:.3f}'.format))
+    if args.profile_output is not None:
+        profiler.to_json(args.profile_output)
+        print('... Wrote profile to {}'.format(args.profile_output))
+
+
+def print_progress(start_time):
+    """Return a progress callback that prints the number of addresses done and the throughput
+    """
+    def progress(n_done, n_total):
+        elapsed = time.time() - start_time
+        print('... Geocoded {} of {} addresses ({:.1f} addresses/s)'.format(
+            n_done, n_total, n_done / max(elapsed, 1e-9)))
+    return progress
+
+
 def main(args=None):
     args = parse_arguments()
 
-    if args.subcommand == 'clean':
+    if args.subcommand == 'clean' and args.incremental:
+        from lovelyrita.store import update_store
+
+        chunksize = args.chunksize or DEFAULT_CHUNKSIZE
+        profiler = get_profiler(args)
+        if profiler is not None and args.jobs is not None:
+            print('... Profiling, so cleaning in a single process')
+        print('... Adding new citations from {} to {}'.format(args.in_path, args.out_path))
+        n_read, n_added = update_store(args.out_path, args.in_path, chunksize, workers=args.jobs,
+                                       profiler=profiler)
+        print('... Read {} rows, added {} new citations'.format(n_read, n_added))
+        report_profile(profiler, args)
+
+    elif args.subcommand == 'clean' and (args.chunksize is not None or args.jobs is not None):
+        # a single file is split into chunks so that it can be spread across the workers
+        chunksize = args.chunksize or DEFAULT_CHUNKSIZE
+        profiler = get_profiler(args)
+        if profiler is not None and args.jobs is not None:
+            print('... Profiling, so cleaning in a single process')
+        print('... Cleaning data from {} in chunks of {} rows'.format(args.in_path, chunksize))
+        chunks = iter_data(args.in_path, chunksize, clean=True, workers=args.jobs,
+                           profiler=profiler)
+        n_rows = write_chunks(chunks, args.out_path)
+        print('... Wrote {} rows to {}'.format(n_rows, args.out_path))
+        report_profile(profiler, args)
+
+    elif args.subcommand == 'clean':
+        profiler = get_profiler(args) or Profiler(enabled=False)
         print('... Loading data from {}'.format(args.in_path))
-        df = read_data(args.in_path)
+        with profiler.stage('read_data') as stage:
+            df = read_data(args.in_path)
+            stage['rows_out'] = len(df)
         print('... Cleaning data')
-        df = clean(df)
+        df = clean(df, profiler=profiler, compact_dtypes=False)
+        with profiler.stage('compact', df):
+            df, memory = compact(df, categorical_columns=CATEGORICAL_COLUMNS, report=True)
+        print('... Compacted data from {:.1f} MB to {:.1f} MB'.format(
+            memory['bytes before'].sum() / 2 ** 20, memory['bytes after'].sum() / 2 ** 20))
+        if args.profile:
+            print(memory.to_string())
         print('... Writing output to {}'.format(args.out_path))
-        df.to_csv(args.out_path)
+        with profiler.stage('write_data', df):
+            write_data(df, args.out_path)
+        report_profile(profiler, args)
 
     elif args.subcommand == 'summarize':
-        print('... Loading data from {}'.format(args.in_path))
-        df = read_data(args.in_path)
-        print(summarize(df))
+        print('... Summarizing data from {}'.format(args.in_path))
+        chunks = iter_raw_or_processed(args.in_path, args.chunksize, args.start, args.end)
+        print(summarize(chunks, approximate=args.approximate))
 
     elif args.subcommand == 'convert':
-        from lovelyrita.data import column_map
-        column_map['[latitude]'] = 'latitude'
-        column_map['[longitude]'] = 'longitude'
+        print('... Loading data from {}'.format(args.in_path))
+        if os.path.isdir(args.in_path):
+            from lovelyrita.store import load_store
+            df = load_store(args.in_path, start=args.start, end=args.end)
+        else:
+            df = read_data(args.in_path, clean=args.clean, workers=args.jobs)
+
+        print('... Writing output to {}'.format(args.out_path))
+        write_data(df, args.out_path)
+
+    elif args.subcommand == 'geocode':
+        from lovelyrita.cache import GeocodeCache
+        from lovelyrita.geocode import geocode_citations, geocode_blocks
 
         print('... Loading data from {}'.format(args.in_path))
-        df = read_data(args.in_path, column_map, clean=args.clean)
-
-        out_path = args.out_path
-        if out_path.endswith('.shp'):
-            print('... Converting to GeoDataFrame')
-            df = to_geodataframe(df)
-            print('... Writing output to {}'.format(out_path))
-            write_shapefile(df, out_path)
+        df = load_data(args.in_path)
+
+        cache = GeocodeCache() if args.cache else None
+        geocoder = get_geocoder(args.geocoder, cache=cache, gazetteer=args.gazetteer,
+                                fallback=args.fallback)
+        # the checkpoints of the two strategies hold different rows, so keep them apart
+        extension = '.blocks.checkpoint' if args.interpolate else '.checkpoint'
+        checkpoint_path = args.checkpoint or args.out_path + extension
+
+        print('... Geocoding {} citations, checkpointing to {}'.format(len(df), checkpoint_path))
+        start_time = time.time()
+        if args.interpolate:
+            geocodes = geocode_blocks(df, geocoder, block_size=args.block_size,
+                                      checkpoint_path=checkpoint_path, resume=args.resume,
+                                      batch_size=args.batch_size,
+                                      progress=print_progress(start_time))
         else:
-            raise NotImplementedError('Output file type not supported.')
+            geocodes = geocode_citations(df, geocoder, checkpoint_path=checkpoint_path,
+                                         resume=args.resume, batch_size=args.batch_size,
+                                         progress=print_progress(start_time))
+        print('... Geocoded in {:.1f} s'.format(time.time() - start_time))
+        if cache is not None:
+            print('... Cache {hits} hits, {failures} known failures, '
+                  '{misses} misses'.format(**cache.stats()))
+        if args.geocoder == 'gazetteer':
+            print('... Gazetteer {exact} exact, {fuzzy} fuzzy, {fallback} fallback, '
+                  '{miss} not found'.format(**geocoder.stats))
+
+        print('... Writing output to {}'.format(args.out_path))
+        write_data(df.join(geocodes, rsuffix='_geocoded'), args.out_path)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 from six import string_types
 import re
 import pandas as pd
+from lovelyrita.config import ADDRESS_REPLACEMENTS
+from lovelyrita.utils import map_unique
 
-# use sparingly, these take a lot of time to evaluate
+# applied in order to each unique address by `normalize_addresses`
 REPLACEMENTS = [(r'^ONE ', '1 '),
                 (r'^TWO ', '2 '),
                 (' -', '-'),
@@ -10,6 +12,18 @@ REPLACEMENTS = [(r'^ONE ', '1 '),
                 (r'^#', ''),
                 (r'\bB{1,2}LK{1,2}\s?', '')]
 
+# matches "<letter>|<street name>" when a word in the street name starts with the letter
+PREFIX_INITIAL_PATTERN = re.compile(r'^(.)\|(?:.* )?\1')
+
+# address formats parsed by `parse_addresses`, e.g., 123 MAIN STREET and P123-1 PARK STREET
+STREET_PATTERN = re.compile(r'^(?P<street_number>\d+\-?\d?) (?P<street_name>[\w\d\s]+)')
+PREFIX_STREET_PATTERN = re.compile(r'^(?P<prefix>[A-Z]+)\-?(?P<street_number>\d+[\-\W]?\d?) '
+                                   r'(?P<street_name>[\w\d\s]+)')
+LOT_PATTERN = re.compile(r'^[A-Z]LOT.*LOT$')
+
+# voided citations have their street prefixed with VOID, e.g., ZVOID123 MAIN STREET
+VOID_PATTERN = r'^Z?VOIDZ?'
+
 
 VALID_SUFFIXES = ['AVE', 'AVEN', 'BLOCK', 'BLVD', 'BOULEVARD', 'CIR', 'COURT',
                   'CREST', 'CREEK', 'CRK', 'DR', 'DRI', 'DRIVE', 'HBR', 'HTS',
@@ -17,8 +31,86 @@ VALID_SUFFIXES = ['AVE', 'AVEN', 'BLOCK', 'BLVD', 'BOULEVARD', 'CIR', 'COURT',
                   'PLAZA', 'PLZ', 'R', 'ROAD', 'SR', 'ST', 'STREET',
                   'TERR', 'TERRACE', 'VISTA', 'VW', 'WAY', 'WY']
 
+# spelled out and alternative street suffixes, and the abbreviation used by `normalize_street_name`
+SUFFIX_ABBREVIATIONS = {'AVEN': 'AVE', 'AVENUE': 'AVE', 'BOULEVARD': 'BLVD', 'CIRCLE': 'CIR',
+                        'COURT': 'CT', 'CREEK': 'CRK', 'DRI': 'DR', 'DRIVE': 'DR', 'LANE': 'LN',
+                        'PARKWAY': 'PKWY', 'PKWAY': 'PKWY', 'PLACE': 'PL', 'PLAZA': 'PLZ',
+                        'ROAD': 'RD', 'STREET': 'ST', 'TERRACE': 'TER', 'TERR': 'TER',
+                        'WY': 'WAY'}
+
+
+def compile_replacements(replacements=None):
+    """Compile replacement rules
+
+    Parameters
+    ----------
+    replacements : list of tuples
+        Replacements provided as (pattern to replace, replacement). If None, the rules in the
+        `ADDRESS_REPLACEMENTS` config option are used, or `REPLACEMENTS` if it is not set. An
+        empty list makes no replacements.
+
+    Returns
+    -------
+    A list of (compiled pattern, replacement) tuples
+    """
+    if replacements is None:
+        replacements = REPLACEMENTS if ADDRESS_REPLACEMENTS is None else ADDRESS_REPLACEMENTS
+
+    if len(replacements) > 0 and isinstance(replacements[0], string_types):
+        replacements = [replacements, ]
+
+    return [(re.compile(pattern), replacement) for pattern, replacement in replacements]
+
+
+def normalize_addresses(addresses, replacements=None, void_pattern=VOID_PATTERN):
+    """Strip void markers and apply replacement rules to addresses
+
+    Each unique address is normalized once, in a single pass that applies the void pattern and
+    then each replacement in order, and the result is broadcast back to all rows. The output is
+    the same as `clean.clean_voided` followed by `replace`.
+
+    Parameters
+    ----------
+    addresses : pandas.Series
+    replacements : list of tuples
+        Replacements provided as (pattern to replace, replacement); see `compile_replacements`
+    void_pattern : str
+        Pattern marking voided citations. If None, voided citations are not detected.
 
-def replace(addresses, replacements=REPLACEMENTS, inplace=True):
+    Returns
+    -------
+    A tuple of the normalized addresses and a boolean Series indicating which addresses were
+    voided (None if `void_pattern` is None)
+    """
+    rules = compile_replacements(replacements)
+    void = re.compile(void_pattern) if void_pattern is not None else None
+
+    def normalize(uniques):
+        normalized = []
+        voided = []
+        for address in uniques:
+            n_voids = 0
+            if isinstance(address, string_types):
+                if void is not None:
+                    address, n_voids = void.subn('', address)
+                for pattern, replacement in rules:
+                    address = pattern.sub(replacement, address)
+            normalized.append(address)
+            voided.append(n_voids > 0)
+        return pd.DataFrame({'street': normalized, 'voided': voided}, index=uniques.index)
+
+    result = map_unique(addresses, normalize)
+
+    normalized = result['street'].rename(addresses.name)
+    if void is None:
+        return normalized, None
+
+    # null addresses are not voided
+    voided = result['voided'].fillna(False).astype(bool)
+    return normalized, voided
+
+
+def replace(addresses, replacements=None, inplace=True):
     """Replace text in addresses
 
     Parameters
@@ -26,25 +118,18 @@ def replace(addresses, replacements=REPLACEMENTS, inplace=True):
     addresses : pandas.Series
     replacements : tuple list of tuples
         Replacements provided as (pattern to replace, replacement). Multiple replacements can be 
-        provided as a list of tuples
+        provided as a list of tuples. Defaults to the rules used by `compile_replacements`.
     inplace : bool
 
     Returns
     -------
     If inplace is False, returns the address series with the replacements made.
     """
-    if isinstance(replacements[0], string_types):
-        replacements = [replacements, ]
+    addr, _ = normalize_addresses(addresses, replacements, void_pattern=None)
 
     if inplace:
-        addr = addresses
+        addresses.iloc[:] = addr.values
     else:
-        addr = addresses.copy()
-
-    for pattern, replacement in REPLACEMENTS:
-        addr.replace(pattern, replacement, regex=True, inplace=True)
-
-    if not inplace:
         return addr
 
 
@@ -60,9 +145,7 @@ def parse_123_main_street(addresses):
     A DataFrame containing street name and street column for those rows that were successfully 
     parsed
     """
-    patt = re.compile(r'^(?P<street_number>\d+\-?\d?) (?P<street_name>[\w\d\s]+)')
-
-    street = addresses.str.extract(patt, expand=True)
+    street = addresses.str.extract(STREET_PATTERN, expand=True)
     street.dropna(inplace=True)
 
     return street
@@ -80,22 +163,14 @@ def parse_P123_main_street(addresses):
     A DataFrame containing street name and street column for those rows that were successfully 
     parsed
     """
-    patt = re.compile(r'^(?P<prefix>[A-Z]+)\-?(?P<street_number>\d+[\-\W]?\d?) '
-                      '(?P<street_name>[\w\d\s]+)')
-    street = addresses.str.extract(patt, expand=True)
+    street = addresses.str.extract(PREFIX_STREET_PATTERN, expand=True)
     street.dropna(inplace=True)
 
-    drop_indices = []
-    for i, s in street.iterrows():
-        street_words = s.street_name.split(' ')
-        drop = True
-        for street_word in street_words:
-            if street_word.startswith(s.prefix[0]):
-                drop = False
-        if drop:
-            drop_indices.append(i)
-
-    street.drop(drop_indices, inplace=True)
+    # keep rows where a word in the street name starts with the first letter of the prefix,
+    # e.g., P123 PARK STREET, by matching "P|PARK STREET" with a backreference
+    initial_and_name = street.prefix.str[0] + '|' + street.street_name
+    matches = initial_and_name.str.match(PREFIX_INITIAL_PATTERN)
+    street = street.loc[matches]
 
     return street
 
@@ -103,6 +178,8 @@ def parse_P123_main_street(addresses):
 def parse_addresses(addresses):
     """Parse addresses into street name and number according to several rules.
 
+    Each unique address is parsed once and the result is broadcast back to every row.
+
     Parameter
     ---------
     addresses : pandas.Series
@@ -112,10 +189,14 @@ def parse_addresses(addresses):
     A DataFrame containing street name and street column for those rows that were successfully 
     parsed
     """
+    return map_unique(addresses, _parse_addresses)
+
+
+def _parse_addresses(addresses):
     # Many addresses are in parking lots. Those will not have street numbers, so we should treat 
     # them separately. We will only concern ourselves with potential street addresses.
 
-    lot_indices = addresses.str.contains('^[A-Z]LOT.*LOT$')
+    lot_indices = addresses.str.contains(LOT_PATTERN)
     street_addresses = addresses.loc[~lot_indices]
 
     street = pd.DataFrame({'street_name': None, 'street_number': None},
@@ -128,3 +209,49 @@ def parse_addresses(addresses):
     street.update(new_street)
 
     return street
+
+
+def parse_address(address):
+    """Parse a single address into street number and street name
+
+    The rules are the same as those of `parse_addresses`, which is faster for many addresses.
+
+    Parameters
+    ----------
+    address : str
+
+    Returns
+    -------
+    A tuple of street number and street name, or None if the address could not be parsed
+    """
+    if not isinstance(address, string_types) or LOT_PATTERN.search(address):
+        return None
+
+    match = STREET_PATTERN.match(address)
+    if match is not None:
+        return match.group('street_number'), match.group('street_name')
+
+    match = PREFIX_STREET_PATTERN.match(address)
+    if match is not None and PREFIX_INITIAL_PATTERN.match(
+            match.group('prefix')[0] + '|' + match.group('street_name')):
+        return match.group('street_number'), match.group('street_name')
+
+    return None
+
+
+def normalize_street_name(street_name):
+    """Normalize a street name for matching
+
+    Parameters
+    ----------
+    street_name : str
+
+    Returns
+    -------
+    The street name in upper case, with runs of whitespace collapsed to a single space and the
+    suffix abbreviated, e.g., "Park  Street" becomes "PARK ST"
+    """
+    words = street_name.upper().split()
+    if len(words) > 1:
+        words[-1] = SUFFIX_ABBREVIATIONS.get(words[-1], words[-1])
+    return ' '.join(words)
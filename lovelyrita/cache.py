@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from lovelyrita import config
+
+
+GEOCODE_CACHE_PATH = config.GEOCODE_CACHE_PATH
+GEOCODE_CACHE_TTL = config.GEOCODE_CACHE_TTL
+GEOCODE_CACHE_FAILURE_TTL = config.GEOCODE_CACHE_FAILURE_TTL
+
+# results and failed geocodes are kept in separate tables, so each can expire on its own
+TABLES = ('geocodes', 'failures')
+
+
+def normalize_address(address):
+    """Normalize an address for use as a cache key
+
+    Parameters
+    ----------
+    address : str
+
+    Returns
+    -------
+    The address in upper case with runs of whitespace collapsed to a single space
+    """
+    return ' '.join(address.upper().split())
+
+
+def is_failure(result):
+    """Check whether a geocoding result means that the address could not be geocoded
+
+    Parameters
+    ----------
+    result : dict, tuple or None
+
+    Returns
+    -------
+    True if the result is None or all of its values are None
+    """
+    if result is None:
+        return True
+    values = result.values() if isinstance(result, dict) else result
+    return all(value is None for value in values)
+
+
+class GeocodeCache(object):
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL,
+                 failure_ttl=GEOCODE_CACHE_FAILURE_TTL, timeout=60.):
+        """A persistent cache of geocoding results stored in a SQLite database
+
+        Results are keyed by geocoder backend and normalized address. The database is opened
+        separately in each process and uses write-ahead logging, so one cache file can be
+        shared by several worker processes.
+
+        Parameters
+        ----------
+        path : str
+            Location of the database file, created if it does not exist
+        ttl : float
+            Number of seconds before a cached result expires. If None, results never expire.
+        failure_ttl : float
+            Number of seconds before a cached failure, a result whose values are all None,
+            expires, so that the address is geocoded again. If 0, failures are not cached, and
+            if None, they never expire.
+        timeout : float
+            Number of seconds to wait for another process to release a lock on the database
+        """
+        self.path = str(path)
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._connection = None
+        self._owner = None
+
+    @property
+    def connection(self):
+        # connections cannot be shared with forked processes or other threads, so open one per
+        # process and thread
+        owner = (os.getpid(), threading.get_ident())
+        if self._connection is None or self._owner != owner:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            for table in TABLES:
+                connection.execute("""CREATE TABLE IF NOT EXISTS {} ("""
+                                   """backend TEXT, address TEXT, result TEXT, timestamp REAL, """
+                                   """PRIMARY KEY (backend, address))""".format(table))
+            connection.commit()
+            self._connection = connection
+            self._owner = owner
+        return self._connection
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def get(self, address, backend):
+        """Get a cached result
+
+        Parameters
+        ----------
+        address : str
+        backend : str
+            Name of the geocoder that produced the result
+
+        Returns
+        -------
+        The cached result, or None if the address is not cached or the result has expired. A
+        cached failure is returned as it was stored, with all values None.
+        """
+        address = normalize_address(address)
+        for table in TABLES:
+            query = """SELECT result, timestamp FROM {} WHERE backend = ? AND address = ?"""
+            row = self.connection.execute(query.format(table), (backend, address)).fetchone()
+            if row is None:
+                continue
+            result = json.loads(row[0])
+            # caches written by earlier versions kept failures with the other results
+            if is_failure(result):
+                if self.failure_ttl == 0 or self._is_expired(row[1], self.failure_ttl):
+                    continue
+                self.failures += 1
+                return result
+            if not self._is_expired(row[1], self.ttl):
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    def set(self, address, backend, result):
+        """Store a result in the cache
+
+        Parameters
+        ----------
+        address : str
+        backend : str
+            Name of the geocoder that produced the result
+        result : JSON-serializable object
+        """
+        self.set_many([(address, result)], backend)
+
+    def set_many(self, items, backend):
+        """Store several results in the cache in one transaction
+
+        Failures, results whose values are all None, are stored apart from the other results
+        and expire after `failure_ttl`.
+
+        Parameters
+        ----------
+        items : iterable of tuples
+            (address, result) pairs
+        backend : str
+        """
+        timestamp = time.time()
+        rows = {table: [] for table in TABLES}
+        for address, result in items:
+            table = 'failures' if is_failure(result) else 'geocodes'
+            rows[table].append((backend, normalize_address(address), json.dumps(result),
+                                timestamp))
+        if self.failure_ttl == 0:
+            rows['failures'] = []
+
+        with self.connection:
+            for table, other in zip(TABLES, TABLES[::-1]):
+                # a new result replaces the old one in either table
+                self.connection.executemany("""DELETE FROM {} WHERE backend = ? """
+                                            """AND address = ?""".format(other),
+                                            [row[:2] for row in rows[table]])
+                self.connection.executemany("""INSERT OR REPLACE INTO {} """
+                                            """VALUES (?, ?, ?, ?)""".format(table),
+                                            rows[table])
+
+    def expire(self):
+        """Delete expired results from the cache
+
+        Returns
+        -------
+        The number of results, including failures, deleted
+        """
+        n_deleted = 0
+        with self.connection:
+            for table, ttl in zip(TABLES, (self.ttl, self.failure_ttl)):
+                if ttl is None:
+                    continue
+                cursor = self.connection.execute("""DELETE FROM {} """
+                                                 """WHERE timestamp < ?""".format(table),
+                                                 (time.time() - ttl, ))
+                n_deleted += cursor.rowcount
+        return n_deleted
+
+    def clear(self, backend=None):
+        """Delete all results, or all results for one backend, from the cache
+        """
+        with self.connection:
+            for table in TABLES:
+                if backend is None:
+                    self.connection.execute("""DELETE FROM {}""".format(table))
+                else:
+                    self.connection.execute("""DELETE FROM {} """
+                                            """WHERE backend = ?""".format(table), (backend, ))
+
+    def __len__(self):
+        return self._count('geocodes')
+
+    def stats(self):
+        """Return the number of cache hits, misses and cached failures found, and the number of
+        stored results and failures
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'failures': self.failures,
+                'size': len(self), 'failures_size': self._count('failures')}
+
+    def _count(self, table):
+        query = """SELECT COUNT(*) FROM {}""".format(table)
+        return self.connection.execute(query).fetchone()[0]
+
+    def _is_expired(self, timestamp, ttl):
+        return ttl is not None and timestamp < time.time() - ttl
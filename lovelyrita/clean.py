@@ -1,58 +1,65 @@
-import time
-from datetime import datetime
+import warnings
 import numpy as np
 import pandas as pd
-from lovelyrita.addresses import replace
+from lovelyrita.addresses import normalize_addresses
 from lovelyrita.config import DATETIME_FORMATS
+from lovelyrita.profiler import Profiler
+from lovelyrita.utils import map_unique, concat
+from lovelyrita.schema import CATEGORICAL_COLUMNS
 
 
-def impute_missing_times(datetimes, inplace=True):
+DOLLAR_PATTERN = r'^\s*[-(]?\s*\$'
+# a dollar amount, such as $1,234.50, -$45.00, $-45.00 or ($45.00)
+AMOUNT_PATTERN = (r'^\s*(?P<sign>[-(\s]*\$?[-\s]*)'
+                  r'(?P<number>\d[\d,]*(?:\.\d*)?|\.\d+)\s*\)?\s*$')
+
+
+def impute_missing_times(datetimes, inplace=True, invalid=None):
     """Fill in missing times by interpolating surrounding times
 
+    Missing times before the first valid time or after the last valid time are left missing.
+
     Parameters
     ----------
     datetimes : pandas.Series
     inplace : bool
+    invalid : numpy.ndarray of bool
+        Rows that are left missing, e.g., those whose date or time could not be parsed
 
     Returns
     -------
     The original Series with missing times replaced by interpolated times
     """
-
-    # get valid start and stop indices for null ranges
-
     if not inplace:
         datetimes = datetimes.copy()
 
-    n_rows = len(datetimes)
-
-    null_indices = datetimes.isnull().nonzero()[0]
-
-    if len(null_indices) > 0:
-        # remove all but first in consecutive sequences of nulls
-        valid_starts = null_indices[1:][np.diff(null_indices) > 1]
-        if null_indices[0] > 0:
-            valid_starts = np.r_[null_indices[0], valid_starts]
-        valid_starts -= 1
-
-        # remove all but final in consecutive sequences of nulls
-        valid_ends = null_indices[:-1][np.diff(null_indices) > 1]
-        if null_indices[-1] < (n_rows - 1):
-            valid_ends = np.r_[valid_ends, null_indices[-1]]
-        valid_ends += 1
-
-        for valid_start, valid_end in zip(valid_starts, valid_ends):
-            start_datetime = datetimes.iloc[valid_start]
-            end_datetime = datetimes.iloc[valid_end]
-
-            start_seconds = time.mktime(start_datetime.timetuple())
-            end_seconds = time.mktime(end_datetime.timetuple())
-
-            n = valid_end - valid_start + 1
-            interpolated_seconds = np.linspace(start_seconds, end_seconds, n)
-            interpolated_datetimes = [datetime.fromtimestamp(s) for s in interpolated_seconds]
-            for i, j in enumerate(range(valid_start + 1, valid_end)):
-                datetimes.iloc[j] = interpolated_datetimes[i]
+    null = datetimes.isnull().values
+    valid_indices = np.flatnonzero(~null)
+
+    if null.any() and len(valid_indices) > 1:
+        # only nulls between two valid times can be interpolated
+        null_indices = np.flatnonzero(null)
+        null_indices = null_indices[(null_indices > valid_indices[0]) &
+                                    (null_indices < valid_indices[-1])]
+        if invalid is not None:
+            null_indices = null_indices[~np.asarray(invalid)[null_indices]]
+
+        # interpolate over integer nanoseconds since the epoch (UTC for timezone-aware series)
+        values = datetimes.values
+        nanoseconds = values.view('int64')
+        ends = np.searchsorted(valid_indices, null_indices)
+        start_indices = valid_indices[ends - 1]
+        end_indices = valid_indices[ends]
+        start_nanoseconds = nanoseconds[start_indices]
+        fraction = (null_indices - start_indices) / (end_indices - start_indices)
+        interpolated = start_nanoseconds + np.round(
+            fraction * (nanoseconds[end_indices] - start_nanoseconds)).astype('int64')
+
+        interpolated = pd.DatetimeIndex(interpolated.view(values.dtype))
+        tz = getattr(datetimes.dtype, 'tz', None)
+        if tz is not None:
+            interpolated = interpolated.tz_localize('UTC').tz_convert(tz)
+        datetimes.iloc[null_indices] = interpolated
 
     if not inplace:
         return datetimes
@@ -60,35 +67,68 @@ def impute_missing_times(datetimes, inplace=True):
 
 def find_dollar_columns(dataframe, nrows=100):
     """Find the columns in a DataFrame that contain dollar values
+
+    Only the first `nrows` values of each text column are checked.
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+    nrows : int
+        Number of values to check in each column
+
+    Returns
+    -------
+    A list of column names
     """
     def is_dollar_series(series):
-        # if not hasattr(series.iloc[0], 'startswith'):
-        #     return False
-        for value in series.iloc[:nrows]:
-            if not value.startswith('$'):
-                return False
-        return True
+        sample = series.iloc[:nrows].dropna()
+        return len(sample) > 0 and bool(sample.astype(str).str.match(DOLLAR_PATTERN).all())
 
+    # dollar values are text; skip numeric, datetime and categorical columns
     return [column for column in dataframe
-            if is_dollar_series(dataframe[column].fillna('$').astype('str'))]
+            if dataframe[column].dtype.kind == 'O' and dataframe[column].dtype.name != 'category'
+            and is_dollar_series(dataframe[column])]
 
 
-def convert_dollar_to_float(dollars, inplace=True):
-    """Turns series of values (e.g., $434.44) into floats (e.g., 434.44)
+def convert_dollar_to_float(dollars, inplace=None):
+    """Turns series of values (e.g., $1,434.44) into floats (e.g., 1434.44)
+
+    Commas are ignored, and a minus sign before the first digit (e.g., -$45.00 or $-45.00) or
+    enclosing parentheses make the value negative. Missing values become 0, and values that are
+    not dollar amounts are left missing, with a warning.
 
     Parameters
     ----------
     dollars : pandas.Series of str
+    inplace : bool
+        Deprecated and ignored. The column cannot change type in place, so the converted values
+        are always returned.
+
+    Returns
+    -------
+    A Series of float32
     """
-    if not inplace:
-        dollars = dollars.copy()
+    if inplace is not None:
+        warnings.warn('The inplace argument of convert_dollar_to_float is deprecated and '
+                      'ignored; use the returned Series instead', FutureWarning, stacklevel=2)
 
-    dollars.fillna('$0', inplace=True)
-    dollars.replace(r'\$', '', regex=True, inplace=True)
-    dollars = dollars.astype('float32', copy=False)
+    def parse(uniques):
+        parts = uniques.astype(str).str.extract(AMOUNT_PATTERN)
+        amounts = pd.to_numeric(parts['number'].str.replace(',', '', regex=False))
+        negative = parts['sign'].str.contains(r'[-(]', regex=True).fillna(False).values
+        amounts[negative] = -amounts[negative]
+        # only the unique amounts are parsed as float64, so every row is float32
+        return amounts.astype('float32')
 
-    if not inplace:
-        return dollars
+    amounts = map_unique(dollars, parse)
+
+    missing = dollars.isnull().values
+    n_invalid = np.count_nonzero(amounts.isnull().values & ~missing)
+    if n_invalid > 0:
+        warnings.warn('{} values of {} are not dollar amounts and are left missing'.format(
+            n_invalid, dollars.name), stacklevel=2)
+    amounts[missing] = 0
+    return amounts
 
 
 def infer_datetime_format(dt, datetime_formats=DATETIME_FORMATS):
@@ -111,21 +151,110 @@ def infer_datetime_format(dt, datetime_formats=DATETIME_FORMATS):
     raise Exception('No datetime format detected for {}'.format(dt.iloc[0]))
 
 
-def get_datetime(dataframe):
+def order_datetime_formats(values, datetime_formats, sample_size=1000):
+    """Order datetime formats by how many values in a sample they parse
+
+    Parameters
+    ----------
+    values : pandas.Series of str
+    datetime_formats : list of str
+    sample_size : int
+
+    Returns
+    -------
+    The formats, most common first
+    """
+    if len(values) > sample_size:
+        values = values.sample(sample_size, random_state=0)
+
+    counts = [pd.to_datetime(values, format=datetime_format, errors='coerce').notnull().sum()
+              for datetime_format in datetime_formats]
+    order = np.argsort(counts, kind='mergesort')[::-1]
+    return [datetime_formats[i] for i in order]
+
+
+def parse_datetimes(values, datetime_formats, sample_size=1000):
+    """Parse text that may contain a mix of datetime formats
+
+    Each unique value is parsed once. A sample of the values decides the order in which the
+    formats are tried; each format is then applied with a vectorized exact-format parse to the
+    values that are still unparsed.
+
+    Parameters
+    ----------
+    values : pandas.Series of str
+    datetime_formats : list of str
+    sample_size : int
+        Number of values used to order the formats
+
+    Returns
+    -------
+    A Series of datetimes, with NaT for values that match none of the formats
+    """
+    def parse(uniques):
+        uniques = uniques.dropna()
+        result = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+
+        for datetime_format in order_datetime_formats(uniques, datetime_formats, sample_size):
+            if len(uniques) == 0:
+                break
+            parsed = pd.to_datetime(uniques, format=datetime_format, errors='coerce')
+            valid = parsed.notnull().values
+            result.loc[uniques.index[valid]] = parsed[valid]
+            uniques = uniques[~valid]
+
+        return result
+
+    return map_unique(values, parse, categorical=False)
+
+
+def get_datetime(dataframe, datetime_formats=DATETIME_FORMATS, return_invalid=False):
     """Get a datatime for each row in a DataFrame
 
+    Dates and times are parsed separately, each unique value once, and added together, so a
+    combined date and time string is never built. Rows may use different formats.
+
     Parameters
     ----------
     dataframe : pandas.DataFrame
         A dataframe with `ticket_issue_date` and `ticket_issue_time` columns
+    datetime_formats : list of str
+        Formats of the date and time separated by a space, e.g., '%m/%d/%y %H:%M:%S'
+    return_invalid : bool
+        If True, also return which rows have a date or time that matches none of the formats
 
     Returns
     -------
-    A Series of datetime values
+    A Series of datetime values, with NaT where the date or time is missing or not recognized,
+    and if `return_invalid` is True, an array of bool that is True where it is not recognized.
+    A warning gives the number of dates and times that are not recognized.
     """
-    dt = dataframe['ticket_issue_date'] + ' ' + dataframe['ticket_issue_time']
-    datetime_format = infer_datetime_format(dt)
-    return pd.to_datetime(dt, format=datetime_format)
+    date_formats, time_formats = [], []
+    for datetime_format in datetime_formats:
+        date_format, time_format = datetime_format.split(' ', 1)
+        if date_format not in date_formats:
+            date_formats.append(date_format)
+        if time_format not in time_formats:
+            time_formats.append(time_format)
+
+    invalid = np.zeros(len(dataframe), dtype=bool)
+    parsed = []
+    for column, formats in [('ticket_issue_date', date_formats),
+                            ('ticket_issue_time', time_formats)]:
+        values = parse_datetimes(dataframe[column], formats)
+        not_recognized = values.isnull().values & dataframe[column].notnull().values
+        if not_recognized.any():
+            warnings.warn('{} values of {} match none of the formats {} and are left '
+                          'missing'.format(np.count_nonzero(not_recognized), column, formats),
+                          stacklevel=2)
+        invalid |= not_recognized
+        parsed.append(values)
+
+    dates, times = parsed
+    datetimes = dates + (times - times.dt.normalize())
+    if return_invalid:
+        return datetimes, invalid
+    return datetimes
 
 
 def drop_null(dataframe, inplace=True):
@@ -159,34 +288,198 @@ def clean_voided(dataframe, add_indicator=True):
         If True, add a column `voided` to the dataframe that indicates whether the ticket was 
         voided or not.
     """
-    void_indices = dataframe.street.str.contains(r'^Z?VOIDZ?')
-    dataframe['street'] = dataframe.street.str.replace(r'^Z?VOIDZ?', '')
-    dataframe['voided'] = void_indices
+    street, voided = normalize_addresses(dataframe.street, replacements=[])
+    dataframe['street'] = street
+    if add_indicator:
+        dataframe['voided'] = voided
 
 
-def clean(dataframe):
+def impute_missing_times_chunks(chunks, column='ticket_issue_datetime', profiler=None,
+                                invalid_column='invalid_datetime'):
+    """Fill in missing times across a sequence of DataFrames
+
+    Rows with missing times at the end of a chunk are held back until the next valid time is
+    seen, so the interpolation is the same as if the chunks had been concatenated first.
+
+    Parameters
+    ----------
+    chunks : iterable of pandas.DataFrame
+    column : str
+        The name of the datetime column to impute
+    profiler : lovelyrita.profiler.Profiler
+        If provided, record the imputation as the 'impute_missing_times' stage
+    invalid_column : str
+        The name of a boolean column marking rows that are left missing, if the chunks have it
+
+    Returns
+    -------
+    A generator of DataFrames with missing times replaced by interpolated times
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    anchor = None
+    held = None
+    for chunk in chunks:
+        if held is not None:
+            chunk = concat([held, chunk])
+            held = None
+
+        valid = chunk[column].notnull().values
+        if not valid.any():
+            held = chunk
+            continue
+        last_valid = np.flatnonzero(valid)[-1]
+
+        # prepend the last valid time of the previous chunk so leading nulls are interpolated
+        datetimes = chunk[column].reset_index(drop=True)
+        invalid = chunk[invalid_column].values if invalid_column in chunk else None
+        if anchor is not None:
+            datetimes = pd.concat([pd.Series([anchor]), datetimes], ignore_index=True)
+            if invalid is not None:
+                invalid = np.concatenate([[False], invalid])
+        with profiler.stage('impute_missing_times', chunk):
+            impute_missing_times(datetimes, invalid=invalid)
+        if anchor is not None:
+            datetimes = datetimes.iloc[1:]
+
+        chunk[column] = datetimes.values
+        anchor = chunk[column].iloc[last_valid]
+
+        held = chunk.iloc[last_valid + 1:]
+        yield chunk.iloc[:last_valid + 1]
+
+    # trailing nulls have no valid time after them and are left as they are
+    if held is not None and len(held) > 0:
+        yield held
+
+
+def compact(dataframe, categorical_columns=None, max_unique_fraction=0.5, report=False):
+    """Reduce the memory used by a DataFrame
+
+    Text columns with few unique values become categorical, unused categories are removed, and
+    integer and float columns are downcast to the smallest type that holds their values. Floats
+    with fractions, such as coordinates, are downcast to float32 with some loss of precision.
+    Datetime and boolean columns, which use one value per row already, are kept as they are.
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        Modified in place
+    categorical_columns : list of str
+        Text columns to make categorical. If None, text columns whose number of unique values is
+        at most `max_unique_fraction` of the number of rows are made categorical.
+    max_unique_fraction : float
+    report : bool
+        If True, also return the memory used by each column before and after
+
+    Returns
+    -------
+    The compacted DataFrame, and if `report` is True, a DataFrame indexed by column with the
+    data type and number of bytes before and after, and the number of bytes saved
+    """
+    if report:
+        before = dataframe.memory_usage(deep=True, index=False)
+        dtypes_before = dataframe.dtypes.astype(str)
+
+    for column in dataframe.columns:
+        series = dataframe[column]
+        kind = series.dtype.kind
+        if series.dtype.name == 'category':
+            dataframe[column] = series.cat.remove_unused_categories()
+        elif kind == 'O':
+            if categorical_columns is None:
+                is_categorical = series.nunique() <= max_unique_fraction * len(series)
+            else:
+                is_categorical = column in categorical_columns
+            if is_categorical:
+                dataframe[column] = series.astype('category')
+        elif kind in 'iu':
+            dataframe[column] = pd.to_numeric(series, downcast='integer')
+        elif kind == 'f':
+            downcast = pd.to_numeric(series, downcast='float')
+            # floats holding whole numbers, e.g., ids with missing values, must stay exact
+            values = series.values
+            whole = np.all(np.isnan(values) | (values == np.round(values)))
+            if not whole or np.array_equal(downcast.values, values, equal_nan=True):
+                dataframe[column] = downcast
+
+    if not report:
+        return dataframe
+
+    after = dataframe.memory_usage(deep=True, index=False)
+    memory = pd.DataFrame({'dtype before': dtypes_before,
+                           'dtype after': dataframe.dtypes.astype(str),
+                           'bytes before': before,
+                           'bytes after': after,
+                           'bytes saved': before - after})
+    memory.index.name = 'column'
+    return dataframe, memory
+
+
+def clean_chunks(chunks, profiler=None):
+    """Apply the cleaning steps to a sequence of DataFrames of raw data
+
+    Parameters
+    ----------
+    chunks : iterable of pandas.DataFrame
+    profiler : lovelyrita.profiler.Profiler
+        If provided, record each cleaning stage, summed over the chunks
+
+    Returns
+    -------
+    A generator of cleaned DataFrames
+    """
+    cleaned = (clean(chunk, impute=False, profiler=profiler) for chunk in chunks)
+    return impute_missing_times_chunks(cleaned, profiler=profiler)
+
+
+def clean(dataframe, impute=True, profiler=None, compact_dtypes=True):
     """Apply a series of data cleaning steps to a dataframe of raw data
 
     Parameters
     ----------
     dataframe : pandas.DataFrame
+    impute : bool
+        If True, fill in missing times. Set to False when the dataframe is one chunk of a larger
+        dataset; see `clean_chunks`.
+    profiler : lovelyrita.profiler.Profiler
+        If provided, record the time, rows and memory of each cleaning stage
+    compact_dtypes : bool
+        If True, make the columns in `lovelyrita.schema.CATEGORICAL_COLUMNS` categorical and
+        downcast numeric columns; see `compact`
 
     Returns
     -------
-    A cleaned DataFrame
+    A cleaned DataFrame, with an `invalid_datetime` column that is True where the date or time
+    matches none of the datetime formats. These datetimes are missing and are not imputed.
     """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
 
-    drop_null(dataframe)
-    clean_voided(dataframe)
+    with profiler.stage('drop_null', dataframe):
+        drop_null(dataframe)
 
-    replace(dataframe.street)
+    # strip voids and make address replacements in one pass
+    with profiler.stage('normalize_addresses', dataframe):
+        dataframe['street'], dataframe['voided'] = normalize_addresses(dataframe.street)
 
-    datetimes = get_datetime(dataframe)
-    impute_missing_times(datetimes)
+    with profiler.stage('get_datetime', dataframe):
+        datetimes, invalid = get_datetime(dataframe, return_invalid=True)
+    if impute:
+        with profiler.stage('impute_missing_times', datetimes):
+            impute_missing_times(datetimes, invalid=invalid)
     dataframe['ticket_issue_datetime'] = datetimes
+    # dates and times that were not recognized are not imputed
+    dataframe['invalid_datetime'] = invalid
     dataframe.drop(['ticket_issue_time', 'ticket_issue_date'], axis=1, inplace=True)
 
-    for column in find_dollar_columns(dataframe):
-        convert_dollar_to_float(dataframe[column], inplace=True)
+    with profiler.stage('convert_dollars', dataframe):
+        for column in find_dollar_columns(dataframe):
+            dataframe[column] = convert_dollar_to_float(dataframe[column])
+
+    if compact_dtypes:
+        with profiler.stage('compact', dataframe):
+            compact(dataframe, categorical_columns=CATEGORICAL_COLUMNS)
 
     return dataframe
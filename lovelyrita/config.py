@@ -19,13 +19,31 @@ else:
 
 GOOGLE_API_KEY = config.get('GOOGLE_API_KEY', None)
 GOOGLE_API_URL = config.get('GOOGLE_API_URL', None)
+# maximum number of requests per second made by AsyncGeocoder
+GOOGLE_API_RATE = config.get('GOOGLE_API_RATE', 50)
 
 POSTGIS_HOST = config.get('POSTGIS_HOST', 'localhost')
 POSTGIS_PORT = config.get('POSTGIS_PORT', '5432')
 POSTGIS_DATABASE = config.get('POSTGIS_DATABASE', 'postgres')
 POSTGIS_USERNAME = config.get('POSTGIS_USERNAME', 'postgres')
 POSTGIS_PASSWORD = config.get('POSTGIS_PASSWORD', '')
-
+# number of connections used by PooledPostGISGeocoder
+POSTGIS_POOL_SIZE = config.get('POSTGIS_POOL_SIZE', 4)
+# seconds before a geocoding query is cancelled; never if None
+POSTGIS_TIMEOUT = config.get('POSTGIS_TIMEOUT', None)
+
+GEOCODE_CACHE_PATH = config.get('GEOCODE_CACHE_PATH', str(CONFIG_DIRECTORY / 'geocodes.sqlite'))
+# seconds before a cached geocode expires; never if None
+GEOCODE_CACHE_TTL = config.get('GEOCODE_CACHE_TTL', None)
+# seconds before an address that could not be geocoded is tried again; not cached if 0
+GEOCODE_CACHE_FAILURE_TTL = config.get('GEOCODE_CACHE_FAILURE_TTL', 24 * 60 * 60)
+
+# columns to load from raw data; if empty, the columns in lovelyrita.schema are loaded
 VALID_COLUMN_NAMES = config.get('VALID_COLUMN_NAMES', [])
+# a dict of raw column name: column name, added to the renames in lovelyrita.schema
+COLUMN_MAP = config.get('COLUMN_MAP', {})
+
+# a list of [pattern, replacement] pairs used in place of the default address replacements
+ADDRESS_REPLACEMENTS = config.get('ADDRESS_REPLACEMENTS', None)
 
 DATETIME_FORMATS = ['%m/%d/%y %H:%M:%S', '%m/%d/%y %H:%M', '%Y-%m-%d %H:%M']
@@ -1,13 +1,27 @@
 from __future__ import print_function
+import os
+from functools import partial
 import numpy as np
 import pandas as pd
-from shapely.geometry import Point
 import geopandas
-from lovelyrita.clean import clean as clean_data
-from lovelyrita.config import VALID_COLUMN_NAMES as valid_column_names
+from lovelyrita.clean import clean as clean_data, impute_missing_times_chunks
+from lovelyrita import summary
+from lovelyrita.utils import parallel_map, map_unique, concat
+from lovelyrita.config import VALID_COLUMN_NAMES
+from lovelyrita.schema import COLUMN_NAMES, get_dtypes, rename_columns
 
+valid_column_names = VALID_COLUMN_NAMES or COLUMN_NAMES
 
-def read_data(paths, usecols=None, delimiter=',', clean=False):
+# file formats, by extension, supported by `load_data` and `write_data`
+FILE_FORMATS = {'.csv': 'csv',
+                '.parquet': 'parquet',
+                '.pq': 'parquet',
+                '.geoparquet': 'geoparquet',
+                '.feather': 'feather',
+                '.shp': 'shapefile'}
+
+
+def read_data(paths, usecols=None, delimiter=',', clean=False, workers=None):
     """Load data from a list of file paths.
 
     Parameters
@@ -19,6 +33,10 @@ def read_data(paths, usecols=None, delimiter=',', clean=False):
     dtype : dict
         A dict containing key (column name) and value (data type)
     delimiter : str
+    clean : bool
+        If True, clean each file after it is loaded
+    workers : int
+        If provided, load and clean the files in this many worker processes
 
     Returns
     -------
@@ -27,24 +45,327 @@ def read_data(paths, usecols=None, delimiter=',', clean=False):
     if not isinstance(paths, (tuple, list)):
         paths = [paths, ]
 
-    dataframe = []
+    if usecols is None:
+        usecols = get_column_names(paths[0])
+
+    load = partial(_read_file, usecols=usecols, delimiter=delimiter, clean=clean)
+    dataframe = list(parallel_map(load, paths, workers=workers))
+
+    dataframe = concat(dataframe).reset_index(drop=True)
+
+    return dataframe
+
+
+def _read_file(path, usecols=None, delimiter=',', clean=False):
+    dtypes = get_dtypes(usecols)
+    engine = get_csv_engine()
+
+    # the pyarrow engine infers the type of categories, e.g., reading badge numbers as integers,
+    # so categorical columns are read as text, as the other engines do, and converted after
+    categorical = [column for column, dtype in dtypes.items() if dtype == 'category']
+    if engine == 'pyarrow':
+        dtypes.update(dict.fromkeys(categorical, 'str'))
+
+    df = pd.read_csv(path, usecols=usecols, delimiter=delimiter, dtype=dtypes, engine=engine)
+    if engine == 'pyarrow':
+        for column in categorical:
+            df[column] = df[column].astype('category')
+
+    df = _strip_street(rename_columns(df))
+
+    if clean:
+        df = clean_data(df)
+
+    return df
+
+
+def iter_data(paths, chunksize, usecols=None, delimiter=',', clean=False, workers=None,
+              profiler=None):
+    """Load data from a list of file paths in chunks of a fixed number of rows.
+
+    Only one chunk (plus any rows with missing times waiting to be imputed) is held in memory at
+    a time, so very large files can be processed.
+
+    Parameters
+    ----------
+    paths : list
+        A list of file paths to the data to be loaded
+    chunksize : int
+        The number of rows to read at a time
+    usecols : list of str
+        If provided, only load these columns
+    delimiter : str
+    clean : bool
+        If True, clean each chunk before it is returned
+    workers : int
+        If provided, clean the chunks in this many worker processes. Chunks are returned in the
+        order they were read.
+    profiler : lovelyrita.profiler.Profiler
+        If provided, record the cleaning stages. Stages run in worker processes cannot be
+        recorded, so the chunks are cleaned in this process and `workers` is ignored.
+
+    Returns
+    -------
+    A generator of DataFrames
+    """
+    if not isinstance(paths, (tuple, list)):
+        paths = [paths, ]
+
     for path in paths:
 
         if usecols is None:
             usecols = get_column_names(path)
 
-        df = pd.read_csv(path, usecols=usecols, delimiter=delimiter)
-
-        df['street'] = df['street'].str.strip(' ')
+        chunks = pd.read_csv(path, usecols=usecols, delimiter=delimiter, chunksize=chunksize,
+                             dtype=get_dtypes(usecols))
+        chunks = (_strip_street(rename_columns(chunk)) for chunk in chunks)
 
         if clean:
-            df = clean_data(df)
+            # missing times are imputed here, in order, since they depend on the previous chunk
+            if profiler is not None:
+                workers = None
+            chunks = parallel_map(partial(clean_data, impute=False, profiler=profiler), chunks,
+                                  workers=workers)
+            chunks = impute_missing_times_chunks(chunks, profiler=profiler)
 
-        dataframe.append(df)
+        for chunk in chunks:
+            yield chunk
 
-    dataframe = pd.concat(dataframe).reset_index(drop=True)
 
-    return dataframe
+def _strip_street(df):
+    df['street'] = map_unique(df['street'], lambda streets: streets.str.strip(' '))
+    return df
+
+
+def get_csv_engine():
+    """Return the fastest available engine for `pandas.read_csv`
+    """
+    try:
+        import pyarrow  # noqa: F401
+        return 'pyarrow'
+    except ImportError:
+        return 'c'
+
+
+def write_chunks(chunks, path):
+    """Write a sequence of DataFrames to a single csv or parquet file, one chunk at a time.
+
+    Parameters
+    ----------
+    chunks : iterable of pandas.DataFrame
+    path : str
+        The file format is chosen from the extension
+
+    Returns
+    -------
+    The number of rows written
+    """
+    file_format = get_file_format(path)
+    if file_format == 'parquet':
+        return _write_parquet_chunks(chunks, path)
+    elif file_format != 'csv':
+        raise NotImplementedError('Cannot write {} files in chunks.'.format(file_format))
+
+    n_rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk = chunk.reset_index(drop=True)
+        chunk.index += n_rows
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0))
+        n_rows += len(chunk)
+
+    return n_rows
+
+
+def _write_parquet_chunks(chunks, path):
+    import pyarrow
+    import pyarrow.parquet
+
+    n_rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, get_arrow_schema(chunk))
+            # every chunk is cast to the types of the first
+            writer.write_table(to_arrow_table(chunk, writer.schema))
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return n_rows
+
+
+def get_arrow_schema(dataframe):
+    """Get the arrow schema used to write a DataFrame, and later DataFrames like it, in chunks
+
+    Categorical columns are stored as dictionaries with int32 indices, so later chunks can have
+    many more categories than the first.
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+
+    Returns
+    -------
+    A pyarrow.Schema
+    """
+    import pyarrow
+    return normalize_arrow_schema(pyarrow.Schema.from_pandas(dataframe, preserve_index=False))
+
+
+def normalize_arrow_schema(schema):
+    """Widen the indices of the dictionary fields of an arrow schema to int32
+
+    Parameters
+    ----------
+    schema : pyarrow.Schema
+
+    Returns
+    -------
+    A pyarrow.Schema
+    """
+    import pyarrow
+    fields = []
+    for field in schema:
+        if pyarrow.types.is_dictionary(field.type):
+            field = field.with_type(pyarrow.dictionary(pyarrow.int32(), field.type.value_type,
+                                                       field.type.ordered))
+        fields.append(field)
+    return pyarrow.schema(fields, metadata=schema.metadata)
+
+
+def to_arrow_table(dataframe, schema):
+    """Convert a DataFrame to an arrow table with a given schema
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+    schema : pyarrow.Schema
+        e.g., from `get_arrow_schema`
+
+    Returns
+    -------
+    A pyarrow.Table
+    """
+    import pyarrow
+    return pyarrow.Table.from_pandas(dataframe, schema=schema, preserve_index=False)
+
+
+def get_file_format(path):
+    """Get the format of a file from its extension
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    One of the values of `FILE_FORMATS`
+    """
+    extension = os.path.splitext(str(path))[1].lower()
+    try:
+        return FILE_FORMATS[extension]
+    except KeyError:
+        raise NotImplementedError('File type {} not supported.'.format(extension))
+
+
+def load_data(path, columns=None, chunksize=None):
+    """Load data written by `write_data`, with the format chosen from the file extension.
+
+    Parquet and feather files keep the data types they were written with. Files containing
+    geometry, such as GeoParquet files and shapefiles, are returned as GeoDataFrames.
+
+    Parameters
+    ----------
+    path : str
+    columns : list of str
+        If provided, only load these columns
+    chunksize : int
+        If provided, return a generator of DataFrames of about this many rows. Csv and parquet
+        files are read one chunk at a time; other formats are loaded in full.
+
+    Returns
+    -------
+    A DataFrame or GeoDataFrame
+    """
+    file_format = get_file_format(path)
+
+    if chunksize is not None and file_format in ('csv', 'parquet'):
+        return _iter_file(path, file_format, columns, chunksize)
+    elif chunksize is not None:
+        return iter([load_data(path, columns=columns)])
+
+    if file_format == 'csv':
+        df = pd.read_csv(path, index_col=0)
+        return df if columns is None else df[columns]
+
+    elif file_format == 'shapefile':
+        df = geopandas.read_file(path)
+        return df if columns is None else df[columns]
+
+    elif file_format in ('parquet', 'geoparquet'):
+        import pyarrow.parquet
+        metadata = pyarrow.parquet.read_schema(path).metadata or {}
+        if b'geo' in metadata:
+            return geopandas.read_parquet(path, columns=columns)
+        return pd.read_parquet(path, columns=columns)
+
+    elif file_format == 'feather':
+        import pyarrow.ipc
+        with pyarrow.memory_map(str(path)) as source:
+            metadata = pyarrow.ipc.open_file(source).schema.metadata or {}
+        if b'geo' in metadata:
+            return geopandas.read_feather(path, columns=columns)
+        return pd.read_feather(path, columns=columns)
+
+
+def _iter_file(path, file_format, columns, chunksize):
+    if file_format == 'csv':
+        for chunk in pd.read_csv(path, index_col=0, chunksize=chunksize):
+            yield chunk if columns is None else chunk[columns]
+
+    elif file_format == 'parquet':
+        import pyarrow.parquet
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+
+
+def write_data(dataframe, path):
+    """Write data, with the format chosen from the file extension.
+
+    Supported extensions are .csv, .parquet (or .pq), .geoparquet, .feather and .shp. Data
+    written to .geoparquet or .shp files is converted to a GeoDataFrame first if necessary.
+    Parquet and feather files preserve data types, including datetimes.
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame or geopandas.GeoDataFrame
+    path : str
+    """
+    file_format = get_file_format(path)
+    is_geo = isinstance(dataframe, geopandas.GeoDataFrame)
+
+    if file_format == 'csv':
+        dataframe.to_csv(path)
+
+    elif file_format == 'parquet':
+        dataframe.to_parquet(path)
+
+    elif file_format == 'geoparquet':
+        if not is_geo:
+            dataframe = to_geodataframe(dataframe, copy=True, datetimes_to_str=False)
+        dataframe.to_parquet(path)
+
+    elif file_format == 'feather':
+        # feather files cannot store an index
+        dataframe.reset_index(drop=True).to_feather(path)
+
+    elif file_format == 'shapefile':
+        if not is_geo:
+            dataframe = to_geodataframe(dataframe, copy=True)
+        write_shapefile(dataframe, path)
 
 
 def get_column_names(path, valid_column_names=valid_column_names):
@@ -53,12 +374,15 @@ def get_column_names(path, valid_column_names=valid_column_names):
     Parameters:
     -----------
     path : str
-    valid_column_names : list of st
+    valid_column_names : list of str
+        Raw column names. Defaults to the `VALID_COLUMN_NAMES` config option, or the columns in
+        `lovelyrita.schema` if it is empty. If None, all columns are returned.
 
     Return:
     -------
+    A list of column names
     """
-    column_names = pd.read_csv(path, nrows=1)
+    column_names = pd.read_csv(path, nrows=0).columns
     if valid_column_names is not None:
         column_names = [n for n in column_names if n in valid_column_names]
     else:
@@ -68,7 +392,7 @@ def get_column_names(path, valid_column_names=valid_column_names):
 
 
 def to_geodataframe(dataframe, copy=False, drop_null_geometry=True,
-                    projection='epsg:4326'):
+                    projection='epsg:4326', datetimes_to_str=True):
     """Convert a pandas DataFrame to geopandas DataFrame.
 
     Parameters
@@ -76,39 +400,48 @@ def to_geodataframe(dataframe, copy=False, drop_null_geometry=True,
     dataframe : pandas.DataFrame
         Must contain latitude and longitude fields
     copy : bool
+        If True, the given dataframe is not modified. Only the rows and columns kept in the
+        output are copied.
     drop_null_geometry : bool
     projection : str
+    datetimes_to_str : bool
+        If True, convert datetime columns to strings, which is required for shapefiles
 
     Returns
     -------
     A GeoDataFrame of the given DataFrame
     """
-    if copy:
-        df = dataframe.copy()
-    else:
-        df = dataframe
+    latitude = dataframe['latitude'].values.astype('float32')
+    longitude = dataframe['longitude'].values.astype('float32')
 
-    df.latitude = df.latitude.astype('float32')
-    df.longitude = df.longitude.astype('float32')
+    # a latitude of 0 (or a missing coordinate) indicates that the citation was not geocoded
+    valid = (latitude != 0) & ~np.isnan(latitude) & ~np.isnan(longitude)
 
-    points = []
-    for x, y in zip(df.latitude, df.longitude):
-        if not x == 0:
-            points.append(Point(y, x))
+    if copy:
+        columns = [c for c in dataframe.columns if c not in ('latitude', 'longitude')]
+        if drop_null_geometry:
+            df = dataframe.loc[valid, columns]
         else:
-            points.append(None)
-    df['geometry'] = points
-
-    df.drop(['latitude', 'longitude'], axis=1, inplace=True)
+            df = dataframe[columns].copy()
+    else:
+        df = dataframe
+        df.drop(['latitude', 'longitude'], axis=1, inplace=True)
+        if drop_null_geometry:
+            df = df.loc[valid]
 
     if drop_null_geometry:
-        df = df.loc[~df.geometry.isnull()]
+        geometry = geopandas.points_from_xy(longitude[valid], latitude[valid])
+    else:
+        geometry = geopandas.points_from_xy(longitude, latitude)
+        geometry[~valid] = None
+    df['geometry'] = geometry
 
-    # geopandas cannot handle datetime formats, so convert to string
-    for column in df.select_dtypes(include=['datetime']):
-        df[column] = df[column].dt.strftime('%m/%d/%y %H:%M:%S')
+    # shapefiles cannot store datetimes, so convert to string
+    if datetimes_to_str:
+        for column in df.select_dtypes(include=['datetime']):
+            df[column] = df[column].dt.strftime('%m/%d/%y %H:%M:%S')
 
-    return geopandas.GeoDataFrame(df, geometry='geometry', crs={'init': projection})
+    return geopandas.GeoDataFrame(df, geometry='geometry', crs=projection)
 
 
 def write_shapefile(geodataframe, path):
@@ -133,35 +466,25 @@ def get_sample_value(series):
     -------
     A sample value from the series or None if all values in the series are null
     """
-    unique = series.unique()
-    for value in unique:
-        if value is not np.nan:
-            return value
+    index = series.first_valid_index()
+    if index is not None:
+        return series.loc[index]
 
 
-def summarize(dataframe):
-    """Generate a summary of the data in a dataframe.
+def summarize(data, approximate=False):
+    """Generate a summary of the data in a DataFrame, or a sequence of DataFrames.
+
+    See `lovelyrita.summary.summarize`.
 
     Parameters
     ----------
-    dataframe : pandas.DataFrame
+    data : pandas.DataFrame or iterable of pandas.DataFrame
+    approximate : bool
+        If True, estimate the number of unique values
 
     Returns
     -------
     A DataFrame containing the data type, number of unique values, a sample value, number and
     percent of null values
     """
-    column_report = []
-    for column in dataframe.columns:
-        unique = dataframe[column].unique()
-        sample = get_sample_value(dataframe[column])
-        n_null = dataframe[column].isnull().sum()
-        pct_null = 100. * n_null / dataframe.shape[0]
-        r = [column, dataframe[column].dtype, len(unique), sample, n_null, pct_null]
-        column_report.append(r)
-
-    columns = ["Column Name", "Data Type", "Unique Count", "Sample Value", "null", "% null"]
-    column_report = pd.DataFrame(column_report, columns=columns).round(2)
-    column_report.sort_values(by="null", inplace=True)
-
-    return column_report
+    return summary.summarize(data, approximate=approximate)
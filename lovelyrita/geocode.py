@@ -1,31 +1,77 @@
+import os
 import re
+import time
+import asyncio
 import requests
 import datetime
+from functools import partial
 from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 import numpy as np
 import psycopg2
+from psycopg2.extensions import QueryCanceledError
 import pandas as pd
 from lovelyrita import config
+from lovelyrita.addresses import parse_address, parse_addresses, normalize_street_name
+from lovelyrita.utils import factorize, map_unique
 
 
 GOOGLE_API_URL = config.GOOGLE_API_URL
 GOOGLE_API_KEY = config.GOOGLE_API_KEY
+GOOGLE_API_RATE = config.GOOGLE_API_RATE
 
 POSTGIS_HOST = config.POSTGIS_HOST
 POSTGIS_PORT = config.POSTGIS_PORT
 POSTGIS_USERNAME = config.POSTGIS_USERNAME
 POSTGIS_PASSWORD = config.POSTGIS_PASSWORD
 POSTGIS_DATABASE = config.POSTGIS_DATABASE
+POSTGIS_POOL_SIZE = config.POSTGIS_POOL_SIZE
+POSTGIS_TIMEOUT = config.POSTGIS_TIMEOUT
+
+GEOCODE_COLUMNS = ['lat', 'lng', 'place_id', 'timestamp']
 
 
 class Geocoder(object):
-    def __init__(self, geocodes=None, api_url=GOOGLE_API_URL, api_key=GOOGLE_API_KEY):
-        if geocodes is None:
-            geocodes = pd.DataFrame(columns=('lat', 'lng', 'place_id', 'timestamp'))
-            geocodes.index.name = 'address'
-        self.geocodes = geocodes
-        self.api_url = GOOGLE_API_URL
-        self.api_key = GOOGLE_API_KEY
+    backend = 'google'
+
+    columns = ['lat', 'lng', 'place_id']
+
+    def __init__(self, geocodes=None, api_url=GOOGLE_API_URL, api_key=GOOGLE_API_KEY,
+                 cache=None):
+        """A Google Maps API geocoder
+
+        Parameters
+        ----------
+        geocodes : pandas.DataFrame
+            Previous results, indexed by address, with columns lat, lng, place_id and timestamp
+        api_url : str
+        api_key : str
+        cache : lovelyrita.cache.GeocodeCache
+            If provided, results are also looked up in and saved to this persistent cache
+        """
+        # results are kept in a dict of address: dict of GEOCODE_COLUMNS
+        self._geocodes = {}
+        if geocodes is not None:
+            self.geocodes = geocodes
+        self.api_url = api_url
+        self.api_key = api_key
+        self.cache = cache
+
+    @property
+    def geocodes(self):
+        """The results of previous queries as a DataFrame indexed by address
+        """
+        geocodes = pd.DataFrame.from_dict(self._geocodes, orient='index',
+                                          columns=GEOCODE_COLUMNS)
+        geocodes.index.name = 'address'
+        return geocodes
+
+    @geocodes.setter
+    def geocodes(self, geocodes):
+        # if an address is duplicated, the last result is kept
+        records = geocodes[GEOCODE_COLUMNS].to_dict('records')
+        self._geocodes = dict(zip(geocodes.index, records))
 
     def geocode(self, address):
         """
@@ -36,15 +82,11 @@ class Geocoder(object):
         address : str
         """
         # check if query has already been run
-        try:
-            g = self.geocodes.loc[address]
+        g = self._lookup(address)
+        if g is not None:
             return g['lat'], g['lng'], g['place_id']
-        except KeyError:
-            pass
 
-        query = {'address': address,
-                 'key': self.api_key}
-        url = self.api_url + 'json?' + urlencode(query)
+        url = self._url(address)
         response = requests.get(url)
         if response.status_code == 404:
             raise Exception("404 error for {}".format(url))
@@ -53,28 +95,238 @@ class Geocoder(object):
         if content['status'] != 'OK':
             raise Exception("Status not OK for {}".format(url))
 
+        g = self._store(address, content)
+        return g['lat'], g['lng'], g['place_id']
+
+    def _url(self, address):
+        query = {'address': address,
+                 'key': self.api_key}
+        return self.api_url + 'json?' + urlencode(query)
+
+    def _lookup(self, address):
+        g = self._geocodes.get(address)
+        if g is None and self.cache is not None:
+            g = self.cache.get(address, self.backend)
+            if g is not None:
+                self._geocodes[address] = g
+        return g
+
+    def _store(self, address, content):
         place_id = content['results'][0]['place_id']
         lat = content['results'][0]['geometry']['location']['lat']
         lng = content['results'][0]['geometry']['location']['lng']
         timestamp = str(datetime.datetime.now())
 
-        new_geocode = pd.Series({'place_id': place_id,
-                                 'lat': lat, 'lng': lng,
-                                 'timestamp': timestamp},
-                                name=address)
-        self.geocodes = self.geocodes.append(new_geocode)
-        return lat, lng, place_id
+        new_geocode = {'place_id': place_id,
+                       'lat': lat, 'lng': lng,
+                       'timestamp': timestamp}
+        self._geocodes[address] = new_geocode
+        if self.cache is not None:
+            self.cache.set(address, self.backend, new_geocode)
+        return new_geocode
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity=None):
+        """A token bucket rate limiter for use in a single asyncio event loop
+
+        Parameters
+        ----------
+        rate : float
+            Number of tokens added per second
+        capacity : float
+            Maximum number of tokens, i.e., the largest burst allowed. Defaults to `rate`.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available and take it
+        """
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncGeocoder(Geocoder):
+    # responses that are retried after a delay
+    retry_statuses = ('OVER_QUERY_LIMIT', 'UNKNOWN_ERROR')
+
+    def __init__(self, geocodes=None, api_url=GOOGLE_API_URL, api_key=GOOGLE_API_KEY,
+                 cache=None, rate=GOOGLE_API_RATE, concurrency=10, retries=5, backoff=0.5,
+                 timeout=30.):
+        """A Google Maps API geocoder that makes concurrent requests with asyncio
+
+        Requires the aiohttp package. Connections are kept alive and reused, and failed
+        requests, including those refused with HTTP 429, are retried with exponential backoff
+        instead of raising.
+
+        Parameters
+        ----------
+        geocodes : pandas.DataFrame
+            Previous results, indexed by address, with columns lat, lng, place_id and timestamp
+        api_url : str
+        api_key : str
+        cache : lovelyrita.cache.GeocodeCache
+            If provided, results are also looked up in and saved to this persistent cache
+        rate : float
+            Maximum number of requests per second
+        concurrency : int
+            Maximum number of requests in flight at once
+        retries : int
+            Number of times to retry a request after a server error, HTTP 429 or
+            OVER_QUERY_LIMIT
+        backoff : float
+            Number of seconds to wait before the first retry, doubled for each further retry
+        timeout : float
+            Number of seconds before a request is abandoned
+        """
+        super(AsyncGeocoder, self).__init__(geocodes=geocodes, api_url=api_url,
+                                            api_key=api_key, cache=cache)
+        self.rate = rate
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def geocode(self, address):
+        """
+        Pull data from Google Maps API
+
+        Parameters
+        ----------
+        address : str
+        """
+        return self.geocode_many([address])[0]
+
+    def geocode_many(self, addresses):
+        """Geocode several addresses concurrently
+
+        If an event loop is already running in this thread, e.g., in a Jupyter notebook, the
+        requests are made in a new event loop in another thread.
+
+        Parameters
+        ----------
+        addresses : list of str
+
+        Returns
+        -------
+        A list of (lat, lng, place_id) tuples, in the same order as the addresses. All values are
+        None for addresses that could not be geocoded.
+        """
+        unique_addresses = list(dict.fromkeys(addresses))
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            results = asyncio.run(self._geocode_many(unique_addresses))
+        else:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                results = executor.submit(asyncio.run,
+                                          self._geocode_many(unique_addresses)).result()
+        results = dict(zip(unique_addresses, results))
+        return [results[address] for address in addresses]
+
+    async def _geocode_many(self, addresses):
+        import aiohttp
+
+        # a fixed number of workers take addresses from a queue, so at most `concurrency`
+        # requests wait on the rate limiter or are in flight at once
+        queue = asyncio.Queue()
+        for i, address in enumerate(addresses):
+            queue.put_nowait((i, address))
+        results = [None, ] * len(addresses)
+
+        limiter = TokenBucket(self.rate)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def work():
+                while not queue.empty():
+                    i, address = queue.get_nowait()
+                    results[i] = await self._geocode(session, limiter, address)
+
+            n_workers = max(1, min(self.concurrency, len(addresses)))
+            await asyncio.gather(*[work() for _ in range(n_workers)])
+        return results
+
+    async def _geocode(self, session, limiter, address):
+        import aiohttp
+
+        g = self._lookup(address)
+        if g is not None:
+            return g['lat'], g['lng'], g['place_id']
+
+        url = self._url(address)
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            await limiter.acquire()
+
+            try:
+                async with session.get(url) as response:
+                    # too many requests, or a server error
+                    if response.status == 429 or response.status >= 500:
+                        continue
+                    if response.status != 200:
+                        break
+                    content = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                continue
+
+            if content['status'] in self.retry_statuses:
+                continue
+            if content['status'] == 'OK':
+                g = self._store(address, content)
+                return g['lat'], g['lng'], g['place_id']
+            break
+
+        return None, None, None
 
 
 class PostGISGeocoder(object):
+    backend = 'postgis'
+
+    columns = ['rating', 'longitude', 'latitude',
+               'street_number', 'street_name', 'street_suffix']
+
+    # geocode each address in an array, keeping its position so results can be put in order
+    query = ("""SELECT a.i, g.rating, ST_X(g.geomout) As lon, ST_Y(g.geomout) As lat, """
+             """(g.addy).address As stno, (g.addy).streetname As street, """
+             """(g.addy).streettypeabbrev As styp, """
+             """(g.addy).location As city, """
+             """(g.addy).stateabbrev As st, (g.addy).zip """
+             """FROM unnest(%s::text[]) WITH ORDINALITY As a(address, i) """
+             """LEFT JOIN LATERAL geocode(a.address, 1) As g ON true;""")
+
     def __init__(self, host=POSTGIS_HOST, port=POSTGIS_PORT, database=POSTGIS_DATABASE,
-                 user=POSTGIS_USERNAME, password=POSTGIS_PASSWORD):
+                 user=POSTGIS_USERNAME, password=POSTGIS_PASSWORD, cache=None,
+                 batch_size=500, connection=None):
         """A PostGIS geocoder
+
+        Parameters
+        ----------
+        cache : lovelyrita.cache.GeocodeCache
+            If provided, results are looked up in and saved to this persistent cache
+        batch_size : int
+            Number of addresses sent to the database in each query by `geocode_many`
+        connection : psycopg2.extensions.connection
+            If provided, use this connection (or any DB-API connection with the same interface)
+            instead of connecting to the database
         """
-        connection = psycopg2.connect(host=host, database=database,
-                                      user=user, port=port, password=password)
+        if connection is None:
+            connection = psycopg2.connect(host=host, database=database,
+                                          user=user, port=port, password=password)
         self.connection = connection
         self.cursor = connection.cursor()
+        self.cache = cache
+        self.batch_size = batch_size
 
     def geocode(self, address):
         """Get the latitude and longitude of an address
@@ -88,36 +340,422 @@ class PostGISGeocoder(object):
         A dictionary containing keys latitude, longitude, street_number, street_name, street_type, and 
         rating (a numeric value indicating how uncertain the geocoding is)
         """
+        return self.geocode_many([address])[0]
+
+    def geocode_many(self, addresses):
+        """Get the latitude and longitude of several addresses
+
+        Addresses are sent to the database `batch_size` at a time, each batch in a single query.
+
+        Parameters
+        ----------
+        addresses : list of str
+
+        Returns
+        -------
+        A list with a dictionary for each address, as returned by `geocode`. All values are None
+        for addresses that could not be geocoded.
+        """
+        results = [None, ] * len(addresses)
+
+        if self.cache is not None:
+            for i, address in enumerate(addresses):
+                results[i] = self.cache.get(address, self.backend)
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        batches = [pending[start:start + self.batch_size]
+                   for start in range(0, len(pending), self.batch_size)]
+        queries = self._map(self._query, [[addresses[i] for i in batch] for batch in batches])
+
+        for batch, batch_results in zip(batches, queries):
+            for i, result in zip(batch, batch_results):
+                results[i] = result
+
+            if self.cache is not None:
+                self.cache.set_many([(addresses[i], results[i]) for i in batch], self.backend)
+
+        return results
+
+    def _map(self, function, batches):
+        return map(function, batches)
+
+    def _query(self, addresses):
+        return self._execute(self.cursor, addresses)
+
+    def _execute(self, cursor, addresses):
         patt = "[" + re.escape(r"()\'+!*") + "]"
-        address = re.sub(patt, '', address)
-
-        columns = ['rating', 'longitude', 'latitude',
-                   'street_number', 'street_name', 'street_suffix']
-
-        query = ("""SELECT g.rating, ST_X(g.geomout) As lon, ST_Y(g.geomout) As lat, """
-                 """(addy).address As stno, (addy).streetname As street, """
-                 """(addy).streettypeabbrev As styp, """
-                 """(addy).location As city, """
-                 """(addy).stateabbrev As st,(addy).zip """
-                 """FROM geocode(%s, 1) As g;""")
-        self.cursor.execute(query, (address, ))
-        response = self.cursor.fetchone()
-
-        if response:
-            result = {k: v for k, v in zip(columns, response)}
-        else:
-            result = [None, ] * len(columns)
+        query_addresses = [re.sub(patt, '', address) for address in addresses]
+
+        cursor.execute(self.query, (query_addresses, ))
+
+        results = [dict.fromkeys(self.columns) for _ in addresses]
+        for response in cursor.fetchall():
+            # ordinality starts at 1; addresses that were not geocoded have a null rating
+            if response[1] is not None:
+                results[response[0] - 1] = {k: v for k, v in zip(self.columns, response[1:])}
+
+        return results
+
 
-        return result
+class PooledPostGISGeocoder(PostGISGeocoder):
+    def __init__(self, host=POSTGIS_HOST, port=POSTGIS_PORT, database=POSTGIS_DATABASE,
+                 user=POSTGIS_USERNAME, password=POSTGIS_PASSWORD, cache=None,
+                 batch_size=50, pool_size=POSTGIS_POOL_SIZE, timeout=POSTGIS_TIMEOUT,
+                 retries=3, connect=None):
+        """A PostGIS geocoder that runs batches of queries concurrently over a pool of connections
+
+        Parameters
+        ----------
+        cache : lovelyrita.cache.GeocodeCache
+            If provided, results are looked up in and saved to this persistent cache
+        batch_size : int
+            Number of addresses in each query. Smaller batches spread the work more evenly
+            across the connections.
+        pool_size : int
+            Maximum number of connections, and so of concurrent queries
+        timeout : float
+            Number of seconds before a query is cancelled. Addresses in a batch that times out are
+            retried one at a time, and any that time out on their own are not geocoded.
+        retries : int
+            Number of times to reconnect and retry a query after the connection is lost
+        connect : callable
+            Returns a new connection. Defaults to `psycopg2.connect` with the given parameters.
+        """
+        if connect is None:
+            connect = partial(psycopg2.connect, host=host, database=database,
+                              user=user, port=port, password=password)
+        self._connect = connect
+        self.cache = cache
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+
+        # connections are opened the first time they are needed
+        self.pool = Queue()
+        for _ in range(pool_size):
+            self.pool.put(None)
+
+    def close(self):
+        """Close all of the connections in the pool
+        """
+        for _ in range(self.pool_size):
+            connection = self.pool.get()
+            self._close(connection)
+            self.pool.put(None)
+
+    def _map(self, function, batches):
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            return list(executor.map(function, batches))
+
+    def _query(self, addresses):
+        try:
+            return self._query_with_retries(addresses)
+        except QueryCanceledError:
+            if len(addresses) == 1:
+                return [dict.fromkeys(self.columns)]
+            return [self._query([address])[0] for address in addresses]
+
+    def _query_with_retries(self, addresses):
+        connection = self.pool.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    if connection is None:
+                        connection = self._new_connection()
+                    return self._execute(connection.cursor(), addresses)
+                except QueryCanceledError:
+                    raise
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # the connection was lost, so open a new one
+                    self._close(connection)
+                    connection = None
+                    if attempt == self.retries:
+                        raise
+        finally:
+            self.pool.put(connection)
 
+    def _new_connection(self):
+        connection = self._connect()
+        connection.autocommit = True
+        if self.timeout is not None:
+            connection.cursor().execute('SET statement_timeout = %s',
+                                        (int(1000 * self.timeout), ))
+        return connection
 
-def geocode_citations(citations, geocoder=None):
+    def _close(self, connection):
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+def load_gazetteer(path, column_map=None, projection='epsg:4326'):
+    """Load a file of address points for `GazetteerGeocoder`
+
+    Parameters
+    ----------
+    path : str
+        A csv or parquet file, or any file geopandas can read, such as a shapefile
+    column_map : dict
+        Names of the columns in the file, keyed by the names used here: street_number,
+        street_name, latitude and longitude
+    projection : str
+        Projection of the latitude and longitude, if they are taken from a geometry column
+
+    Returns
+    -------
+    A DataFrame with columns street_number, street_name, latitude and longitude. If the file has
+    a geometry column and no latitude and longitude, the center of each geometry is used, so
+    street segments are placed at their midpoint.
+    """
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension == '.csv':
+        points = pd.read_csv(path)
+    elif extension in ('.parquet', '.pq'):
+        points = pd.read_parquet(path)
+    else:
+        import geopandas
+        points = geopandas.read_file(path)
+
+    if column_map is not None:
+        points = points.rename(columns={v: k for k, v in column_map.items()})
+
+    if 'latitude' not in points and 'geometry' in points:
+        import geopandas
+        geometry = geopandas.GeoSeries(points['geometry'], crs=getattr(points, 'crs', None))
+        if geometry.crs is not None:
+            geometry = geometry.to_crs(projection)
+        centers = geometry.representative_point()
+        points = pd.DataFrame(points.drop(columns='geometry'))
+        points['latitude'], points['longitude'] = centers.y.values, centers.x.values
+
+    return points[['street_number', 'street_name', 'latitude', 'longitude']]
+
+
+def _trigrams(text):
+    text = '  ' + text + ' '
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def _edit_distance(a, b):
+    """The number of insertions, deletions, substitutions and transpositions of adjacent
+    characters needed to turn one string into another"""
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        before, previous = previous, current
+    return previous[-1]
+
+
+class GazetteerGeocoder(object):
+    backend = 'gazetteer'
+
+    columns = ['latitude', 'longitude', 'street_number', 'street_name', 'match']
+
+    def __init__(self, points, fallback=None, min_similarity=0.8, n_candidates=10):
+        """An offline geocoder that looks up addresses in a table of address points
+
+        Addresses are parsed into street number and street name with the rules of
+        `lovelyrita.addresses.parse_addresses`. A street name that is not in the table is matched
+        to the most similar name that shares trigrams with it and is within the edit distance
+        allowed by `min_similarity`. Addresses that are still not found are passed to the
+        fallback geocoder.
+
+        Parameters
+        ----------
+        points : pandas.DataFrame
+            Address points with columns street_number, street_name, latitude and longitude, e.g.,
+            from `load_gazetteer`. Points missing any of these are ignored.
+        fallback : Geocoder or PostGISGeocoder
+            If provided, geocodes the addresses that are not in the table
+        min_similarity : float
+            Smallest similarity, one minus the edit distance divided by the length of the longer
+            name, for two street names to match
+        n_candidates : int
+            Number of street names, those sharing the most trigrams, compared by edit distance
+        """
+        self.fallback = fallback
+        self.min_similarity = min_similarity
+        self.n_candidates = n_candidates
+        self.stats = dict.fromkeys(['exact', 'fuzzy', 'fallback', 'miss'], 0)
+
+        # points without a number or name, common in address point extracts, cannot be matched
+        points = points.dropna(subset=['street_number', 'street_name', 'latitude', 'longitude'])
+        numbers = points['street_number']
+        if numbers.dtype.kind in 'fiu':
+            numbers = numbers.astype('int64')
+        numbers = numbers.astype(str).str.strip().values
+        names = map_unique(points['street_name'].astype(str), lambda uniques: pd.Series(
+            [normalize_street_name(name) for name in uniques], index=uniques.index),
+            categorical=False).values
+
+        # street name: {street number: (latitude, longitude)}
+        self.streets = {}
+        for number, name, latitude, longitude in zip(numbers, names, points['latitude'].values,
+                                                     points['longitude'].values):
+            self.streets.setdefault(name, {})[number] = (float(latitude), float(longitude))
+
+        self._names = list(self.streets)
+        self._trigram_index = {}
+        for i, name in enumerate(self._names):
+            for trigram in _trigrams(name):
+                self._trigram_index.setdefault(trigram, []).append(i)
+        self._matches = {}
+
+    def geocode(self, address):
+        """Get the latitude and longitude of an address
+
+        Parameters
+        ----------
+        address : str
+            e.g., 123 MAIN ST, OAKLAND, CA
+
+        Returns
+        -------
+        A dictionary of `columns`. `match` is 'exact', 'fuzzy' (the street name was matched by
+        similarity) or 'fallback', and all values are None if the address was not found.
+        """
+        return self.geocode_many([address])[0]
+
+    def geocode_many(self, addresses):
+        """Get the latitude and longitude of several addresses
+
+        Addresses that are not in the table are passed to the fallback geocoder together.
+
+        Parameters
+        ----------
+        addresses : list of str
+
+        Returns
+        -------
+        A list with a dictionary for each address, as returned by `geocode`
+        """
+        results = [self._lookup(address) for address in addresses]
+
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses and self.fallback is not None:
+            pending = [addresses[i] for i in misses]
+            if hasattr(self.fallback, 'geocode_many'):
+                fallback_results = self.fallback.geocode_many(pending)
+            else:
+                fallback_results = [self.fallback.geocode(address) for address in pending]
+            for i, result in zip(misses, fallback_results):
+                results[i] = self._from_fallback(result)
+
+        for i, result in enumerate(results):
+            if result is None:
+                self.stats['miss'] += 1
+                results[i] = dict.fromkeys(self.columns)
+            else:
+                self.stats[result['match']] += 1
+        return results
+
+    def match_street_name(self, street_name):
+        """Find the street name in the table that matches a street name
+
+        Parameters
+        ----------
+        street_name : str
+            A normalized street name; see `lovelyrita.addresses.normalize_street_name`
+
+        Returns
+        -------
+        A tuple of the matching name and whether it was matched by similarity, or None
+        """
+        if street_name in self.streets:
+            return street_name, False
+        if street_name not in self._matches:
+            self._matches[street_name] = self._fuzzy_match(street_name)
+        match = self._matches[street_name]
+        return None if match is None else (match, True)
+
+    def _fuzzy_match(self, street_name):
+        shared = {}
+        for trigram in _trigrams(street_name):
+            for i in self._trigram_index.get(trigram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        candidates = sorted(shared, key=shared.get, reverse=True)[:self.n_candidates]
+
+        best, best_similarity = None, self.min_similarity
+        for i in candidates:
+            name = self._names[i]
+            similarity = 1 - _edit_distance(street_name, name) / max(len(street_name), len(name))
+            if similarity >= best_similarity:
+                best, best_similarity = name, similarity
+        return best
+
+    def _lookup(self, address):
+        parsed = parse_address(address)
+        if parsed is None:
+            return None
+        street_number, street_name = parsed
+
+        match = self.match_street_name(normalize_street_name(street_name))
+        if match is None:
+            return None
+        street_name, fuzzy = match
+
+        numbers = self.streets[street_name]
+        location = numbers.get(street_number)
+        if location is None:
+            # e.g., the space number of P123-1 PARK ST
+            street_number = re.match(r'\d+', street_number).group()
+            location = numbers.get(street_number)
+        if location is None:
+            return None
+
+        return {'latitude': location[0], 'longitude': location[1],
+                'street_number': street_number, 'street_name': street_name,
+                'match': 'fuzzy' if fuzzy else 'exact'}
+
+    def _from_fallback(self, result):
+        if result is None:
+            return None
+        if not isinstance(result, dict):
+            result = dict(zip(self.fallback.columns, result))
+        latitude = result.get('latitude', result.get('lat'))
+        longitude = result.get('longitude', result.get('lng'))
+        if latitude is None or longitude is None:
+            return None
+        return {'latitude': latitude, 'longitude': longitude,
+                'street_number': result.get('street_number'),
+                'street_name': result.get('street_name'),
+                'match': 'fallback'}
+
+
+def geocode_citations(citations, geocoder=None, checkpoint_path=None, resume=True,
+                      batch_size=1000, progress=None):
     """Geocode a DataFrame of citations
 
+    Each unique address is geocoded once. Addresses are geocoded `batch_size` at a time, and if a
+    checkpoint path is given, the results for the citations in each batch are appended to it so
+    that an interrupted run can be resumed.
+
     Parameters:
     -----------
     citations : pandas.DataFrame
-    rating : int
+    geocoder : Geocoder or PostGISGeocoder
+        Defaults to a new PostGISGeocoder
+    checkpoint_path : str
+        A csv file of the citation index and geocoding results completed so far
+    resume : bool
+        If True, citations already in the checkpoint file are not geocoded again. If False, an
+        existing checkpoint file is overwritten.
+    batch_size : int
+        Number of unique addresses geocoded between checkpoints
+    progress : callable
+        If provided, called after each batch with the number of unique addresses geocoded so
+        far and the total number to geocode. Otherwise a progress bar is shown if the
+        progressbar package is installed.
 
     Returns:
     --------
@@ -127,18 +765,174 @@ def geocode_citations(citations, geocoder=None):
     if geocoder is None:
         geocoder = PostGISGeocoder()
 
-    results = []
-    indices = []
-    try:
-        from progressbar import progressbar
-        iterator = progressbar(citations.iterrows(), max_value=len(citations))
-    except ImportError:
-        iterator = citations.iterrows()
-
-    for index, row in iterator:
-        address = ', '.join(row[['street', 'city', 'state']])
-        result = geocoder.geocode(address)
-        indices.append(index)
-        results.append(result)
-
-    return pd.DataFrame(results, index=indices)
+    columns = getattr(geocoder, 'columns', None)
+    index = citations.index
+
+    completed = []
+    if checkpoint_path is not None and resume and os.path.exists(checkpoint_path):
+        checkpoint = pd.read_csv(checkpoint_path, index_col=0)
+        try:
+            checkpoint.index = checkpoint.index.astype(citations.index.dtype)
+        except (TypeError, ValueError):
+            raise ValueError('The index of the checkpoint {} does not match that of the '
+                             'citations; it was written for other data'.format(checkpoint_path))
+        completed.append(checkpoint)
+        citations = citations.loc[~citations.index.isin(checkpoint.index)]
+    elif checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    codes, addresses = factorize(citations[['street', 'city', 'state']])
+    addresses = [', '.join(address) for address in addresses.itertuples(index=False)]
+
+    # sort the rows by address so the rows of each batch of addresses are contiguous
+    order = np.argsort(codes, kind='mergesort')
+    bounds = np.searchsorted(codes[order], np.arange(0, len(addresses) + batch_size, batch_size))
+
+    batches = range(0, len(addresses), batch_size)
+    if progress is None:
+        try:
+            from progressbar import progressbar
+            batches = progressbar(batches, max_value=len(batches))
+        except ImportError:
+            pass
+
+    for i, start in enumerate(batches):
+        batch = addresses[start:start + batch_size]
+
+        # geocoders with a batch interface get the whole batch at once
+        if hasattr(geocoder, 'geocode_many'):
+            results = geocoder.geocode_many(batch)
+        else:
+            results = [geocoder.geocode(address) for address in batch]
+        results = pd.DataFrame(results, columns=columns)
+
+        rows = order[bounds[i]:bounds[i + 1]]
+        results = results.iloc[codes[rows] - start]
+        results.index = citations.index[rows]
+        completed.append(results)
+
+        if checkpoint_path is not None:
+            write_header = not os.path.exists(checkpoint_path)
+            results.to_csv(checkpoint_path, mode='a', header=write_header)
+
+        if progress is not None:
+            progress(start + len(batch), len(addresses))
+
+    if len(completed) == 0:
+        return pd.DataFrame(columns=columns, index=index)
+    return pd.concat(completed).reindex(index)
+
+
+def geocode_blocks(citations, geocoder=None, block_size=100, checkpoint_path=None, resume=True,
+                   batch_size=1000, progress=None):
+    """Geocode a DataFrame of citations, interpolating house numbers within each block face
+
+    Addresses are parsed with `lovelyrita.addresses.parse_addresses` and grouped into block
+    faces: the same street, city and state, the same block of `block_size` numbers, and the
+    same side of the street (odd or even numbers). Only the lowest and highest numbers seen on
+    each block face are geocoded; the location of the other numbers is interpolated linearly
+    between them. Addresses that cannot be parsed are geocoded as they are.
+
+    Parameters:
+    -----------
+    citations : pandas.DataFrame
+    geocoder : Geocoder, PostGISGeocoder or GazetteerGeocoder
+        Defaults to a new PostGISGeocoder
+    block_size : int
+        Number of house numbers in a block, e.g., 100 for 1200 to 1299
+    checkpoint_path, resume, batch_size, progress
+        Passed to `geocode_citations` to geocode the block face ends. The checkpoint is keyed by
+        address rather than by citation, so a checkpoint written by `geocode_citations` cannot
+        be resumed here, and vice versa.
+
+    Returns:
+    --------
+    A DataFrame with columns latitude, longitude and quality, which is one of:
+
+    - 'geocoded': the address itself was geocoded
+    - 'interpolated': the location was interpolated between the ends of the block face
+    - 'block': only one end of the block face was geocoded, and its location is used
+    - None: the address could not be geocoded
+    """
+    codes, addresses = factorize(citations[['street', 'city', 'state']])
+
+    parsed = parse_addresses(addresses['street'])
+    addresses['street_name'] = parsed['street_name'].astype(object).values
+    addresses['number'] = pd.to_numeric(parsed['street_number'].astype(object).str.extract(
+        r'^(\d+)', expand=False), errors='coerce').values
+    blocks = addresses.dropna(subset=['street_name', 'number'])
+    unparsed = addresses.drop(blocks.index)
+
+    faces = [blocks['street_name'], blocks['city'], blocks['state'],
+             blocks['number'] // block_size, blocks['number'] % 2]
+    numbers = blocks.groupby(faces, observed=True, dropna=False)['number']
+    low, high = numbers.transform('min'), numbers.transform('max')
+
+    # geocode each end of each block face, and the addresses that could not be parsed, once
+    ends = pd.concat([blocks[['street_name', 'city', 'state']].assign(number=low),
+                      blocks[['street_name', 'city', 'state']].assign(number=high)])
+    ends = ends.drop_duplicates()
+    ends['street'] = ends['number'].astype('int64').astype(str) + ' ' + ends['street_name']
+    targets = pd.concat([ends[['street', 'city', 'state']],
+                         unparsed[['street', 'city', 'state']].dropna()]).drop_duplicates()
+    targets = targets.sort_values(['street', 'city', 'state'])
+    # the checkpoint is keyed by address, so it can only be resumed by the same strategy
+    targets.index = pd.Index(['|'.join(str(value) for value in target)
+                              for target in targets.itertuples(index=False)], name='address')
+
+    results = geocode_citations(targets, geocoder, checkpoint_path=checkpoint_path,
+                                resume=resume, batch_size=batch_size, progress=progress)
+    targets['latitude'], targets['longitude'] = _get_coordinates(results)
+
+    def locate(streets, frame):
+        located = frame[['city', 'state']].assign(street=streets.values)
+        located = located.merge(targets, how='left', on=['street', 'city', 'state'])
+        return located['latitude'].values, located['longitude'].values
+
+    low_latitude, low_longitude = locate(
+        low.astype('int64').astype(str) + ' ' + blocks['street_name'], blocks)
+    high_latitude, high_longitude = locate(
+        high.astype('int64').astype(str) + ' ' + blocks['street_name'], blocks)
+
+    span = (high - low).values
+    fraction = np.divide((blocks['number'] - low).values, span,
+                         out=np.zeros(len(blocks)), where=span > 0)
+    latitude = low_latitude + fraction * (high_latitude - low_latitude)
+    longitude = low_longitude + fraction * (high_longitude - low_longitude)
+
+    is_end = ((blocks['number'] == low) | (blocks['number'] == high)).values
+    quality = np.where(is_end, 'geocoded', 'interpolated').astype(object)
+
+    # if only one end was geocoded, use it for the whole block face
+    only_low = ~np.isnan(low_latitude) & np.isnan(high_latitude)
+    only_high = np.isnan(low_latitude) & ~np.isnan(high_latitude)
+    latitude[only_low], longitude[only_low] = low_latitude[only_low], low_longitude[only_low]
+    latitude[only_high], longitude[only_high] = high_latitude[only_high], high_longitude[only_high]
+    is_own_end = (only_low & (blocks['number'] == low).values) | \
+        (only_high & (blocks['number'] == high).values)
+    quality[(only_low | only_high) & ~is_own_end] = 'block'
+    quality[np.isnan(latitude)] = None
+
+    located = pd.DataFrame({'latitude': np.nan, 'longitude': np.nan, 'quality': None},
+                           index=addresses.index)
+    located.loc[blocks.index, 'latitude'] = latitude
+    located.loc[blocks.index, 'longitude'] = longitude
+    located.loc[blocks.index, 'quality'] = quality
+
+    unparsed_latitude, unparsed_longitude = locate(unparsed['street'], unparsed)
+    located.loc[unparsed.index, 'latitude'] = unparsed_latitude
+    located.loc[unparsed.index, 'longitude'] = unparsed_longitude
+    located.loc[unparsed.index, 'quality'] = np.where(np.isnan(unparsed_latitude), None,
+                                                      'geocoded')
+
+    located = located.iloc[codes]
+    located.index = citations.index
+    return located
+
+
+def _get_coordinates(results):
+    """Get the latitude and longitude columns of geocoding results as float arrays"""
+    latitude = results['latitude'] if 'latitude' in results else results['lat']
+    longitude = results['longitude'] if 'longitude' in results else results['lng']
+    return (pd.to_numeric(latitude, errors='coerce').values.astype('float64'),
+            pd.to_numeric(longitude, errors='coerce').values.astype('float64'))
@@ -0,0 +1,161 @@
+from __future__ import division
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+import pandas as pd
+
+
+class Profiler(object):
+    def __init__(self, enabled=True, trace_memory=True):
+        """Record the wall time, number of rows and peak memory of each stage of a pipeline
+
+        Stages with the same name, e.g., the same cleaning step applied to several chunks, are
+        added together.
+
+        Parameters
+        ----------
+        enabled : bool
+            If False, stages are run without being recorded
+        trace_memory : bool
+            If True, record the peak memory allocated during each stage with `tracemalloc`. Only
+            memory allocated through Python, including numpy arrays, is traced, and tracing slows
+            down code that creates many Python objects.
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.stages = OrderedDict()
+        # number of stages running, one inside another
+        self._depth = 0
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name, dataframe=None):
+        """Record a stage
+
+        Stages can be nested. The peak memory of a nested stage is measured from its start, but
+        includes any higher peak reached earlier in the enclosing stage.
+
+        Parameters
+        ----------
+        name : str
+        dataframe : pandas.DataFrame or pandas.Series
+            The data the stage works on. Its length is taken as the number of rows in when the
+            stage starts and as the number of rows out when it ends.
+
+        Yields
+        ------
+        A dict. Set its 'rows_out' item if the stage does not change `dataframe` in place.
+
+        Examples
+        --------
+        >>> profiler = Profiler()
+        >>> with profiler.stage('drop_null', dataframe):
+        ...     drop_null(dataframe)
+        """
+        record = {}
+        if not self.enabled:
+            yield record
+            return
+
+        rows_in = 0 if dataframe is None else len(dataframe)
+        if self.trace_memory and self._depth == 0:
+            # tracing is started by the outermost stage and stopped when it ends, unless it
+            # was already started elsewhere
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            # resetting the peak in a nested stage would lose the peak of the enclosing stage
+            tracemalloc.reset_peak()
+        if self.trace_memory:
+            memory_start = tracemalloc.get_traced_memory()[0]
+
+        self._depth += 1
+        try:
+            start_time = time.perf_counter()
+            yield record
+            seconds = time.perf_counter() - start_time
+
+            peak_memory = None
+            if self.trace_memory:
+                peak_memory = max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.close()
+
+        rows_out = record.get('rows_out', rows_in if dataframe is None else len(dataframe))
+        self.add(name, seconds, rows_in, rows_out, peak_memory)
+
+    def close(self):
+        """Stop tracing memory allocations, if tracing was started by this profiler
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def add(self, name, seconds, rows_in, rows_out, peak_memory=None):
+        """Add a measurement to a stage
+
+        Parameters
+        ----------
+        name : str
+        seconds : float
+        rows_in : int
+        rows_out : int
+        peak_memory : int
+            Number of bytes allocated at the peak, above the amount allocated at the start
+        """
+        stage = self.stages.setdefault(name, {'stage': name, 'calls': 0, 'seconds': 0.,
+                                              'rows_in': 0, 'rows_out': 0, 'peak_memory': None})
+        stage['calls'] += 1
+        stage['seconds'] += seconds
+        stage['rows_in'] += rows_in
+        stage['rows_out'] += rows_out
+        if peak_memory is not None:
+            stage['peak_memory'] = max(stage['peak_memory'] or 0, peak_memory)
+
+    def report(self):
+        """Return the recorded stages
+
+        Returns
+        -------
+        A list of dicts, in the order the stages were first run, with the keys 'stage', 'calls',
+        'seconds', 'rows_in', 'rows_out' and 'peak_memory'
+        """
+        return [dict(stage) for stage in self.stages.values()]
+
+    def to_dataframe(self):
+        """Return the recorded stages as a table, with the share of the total time of each stage
+
+        Returns
+        -------
+        A pandas.DataFrame
+        """
+        table = pd.DataFrame(self.report(), columns=['stage', 'calls', 'seconds', 'rows_in',
+                                                     'rows_out', 'peak_memory'])
+        total = table['seconds'].sum()
+        table['% time'] = 100 * table['seconds'] / total if total > 0 else 0.
+        table['peak_memory_mb'] = table['peak_memory'] / 2 ** 20
+        return table.drop(columns='peak_memory').set_index('stage')
+
+    def to_json(self, path=None):
+        """Write the recorded stages as JSON
+
+        Parameters
+        ----------
+        path : str
+            If provided, write the report to this file
+
+        Returns
+        -------
+        The JSON report as a string
+        """
+        report = json.dumps({'stages': self.report(),
+                             'seconds': sum(stage['seconds'] for stage in self.stages.values())},
+                            indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(report)
+        return report
@@ -0,0 +1,65 @@
+from lovelyrita import config
+
+# raw column names that are renamed when the data is loaded
+COLUMN_MAP = {'[latitude]': 'latitude',
+              '[longitude]': 'longitude'}
+COLUMN_MAP.update(config.COLUMN_MAP)
+
+# data types of the raw columns, after renaming. Low cardinality text is loaded as categorical.
+# Dates, times and dollar amounts are loaded as text and converted when the data is cleaned.
+DTYPES = {'ticket_number': 'str',
+          'ticket_issue_date': 'str',
+          'ticket_issue_time': 'str',
+          'street': 'category',
+          'street_name': 'category',
+          'street_number': 'str',
+          'street_suffix': 'category',
+          'violation_external_code': 'category',
+          'violation_desc_long': 'category',
+          'state': 'category',
+          'city': 'category',
+          'badge_number': 'category',
+          'fine_amount': 'str',
+          'latitude': 'float32',
+          'longitude': 'float32'}
+
+# low cardinality text columns, kept categorical when the data is cleaned
+CATEGORICAL_COLUMNS = [name for name, dtype in DTYPES.items() if dtype == 'category']
+
+# all raw column names known to the schema
+COLUMN_NAMES = list(DTYPES) + list(COLUMN_MAP)
+
+
+def get_dtypes(column_names):
+    """Get the data types of raw columns
+
+    Parameters
+    ----------
+    column_names : list of str
+        Raw column names, before renaming
+
+    Returns
+    -------
+    A dict of raw column name: data type, for those columns in `DTYPES`
+    """
+    dtypes = {}
+    for column_name in column_names:
+        name = COLUMN_MAP.get(column_name, column_name)
+        if name in DTYPES:
+            dtypes[column_name] = DTYPES[name]
+    return dtypes
+
+
+def rename_columns(dataframe):
+    """Rename raw columns in place according to `COLUMN_MAP`
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+
+    Returns
+    -------
+    The renamed DataFrame
+    """
+    dataframe.rename(columns=COLUMN_MAP, inplace=True)
+    return dataframe
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import geopandas
+from lovelyrita.data import to_geodataframe
+
+
+def load_polygons(path, projection='epsg:4326'):
+    """Load polygons, such as zip codes or neighborhoods, from any file geopandas can read
+
+    Parameters
+    ----------
+    path : str
+    projection : str
+        The polygons are converted to this projection, which must match that of the citations
+
+    Returns
+    -------
+    A GeoDataFrame
+    """
+    polygons = geopandas.read_file(path)
+    if polygons.crs is not None:
+        polygons = polygons.to_crs(projection)
+    return polygons
+
+
+def build_index(polygons):
+    """Build a spatial index of polygons
+
+    Parameters
+    ----------
+    polygons : geopandas.GeoDataFrame or geopandas.GeoSeries
+
+    Returns
+    -------
+    A shapely.STRtree of the polygon geometries, in order
+    """
+    import shapely
+    return shapely.STRtree(np.asarray(polygons.geometry.values))
+
+
+def assign_polygons(points, index):
+    """Find the polygon that contains each point
+
+    Parameters
+    ----------
+    points : geopandas.GeoSeries or array of shapely.Point
+    index : shapely.STRtree
+        From `build_index`
+
+    Returns
+    -------
+    An array of int with the position of the polygon that contains each point, or -1 for points
+    outside all polygons. Points in more than one polygon, such as points on an edge shared by
+    two polygons, are assigned to the first.
+    """
+    points = np.asarray(points)
+    # points on the boundary of a polygon are not within it, but do intersect it
+    point_indices, polygon_indices = index.query(points, predicate='intersects')
+
+    assigned = np.full(len(points), -1, dtype='int64')
+    # keep the first polygon of each point
+    order = np.lexsort((polygon_indices, point_indices))
+    point_indices, first = np.unique(point_indices[order], return_index=True)
+    assigned[point_indices] = polygon_indices[order][first]
+    return assigned
+
+
+def aggregate_by_polygon(citations, polygons, sum_columns=('fine_amount',), index=None):
+    """Count the citations in each polygon and sum their fine amounts
+
+    Citations are converted to points with `to_geodataframe`, one chunk at a time, so the
+    geometries of all the citations are never in memory at once.
+
+    Parameters
+    ----------
+    citations : pandas.DataFrame or iterable of pandas.DataFrame
+        Cleaned citations with latitude and longitude columns, e.g., chunks from
+        `lovelyrita.data.load_data` with a `chunksize`
+    polygons : geopandas.GeoDataFrame
+        In the same projection as the citations (EPSG:4326)
+    sum_columns : list of str
+        Numeric columns to sum within each polygon
+    index : shapely.STRtree
+        A prebuilt index of `polygons`, from `build_index`
+
+    Returns
+    -------
+    A copy of `polygons` with a `citations` column of counts and a column of sums for each of
+    `sum_columns`
+    """
+    if isinstance(citations, pd.DataFrame):
+        citations = [citations]
+    if index is None:
+        index = build_index(polygons)
+
+    sum_columns = list(sum_columns)
+    counts = np.zeros(len(polygons), dtype='int64')
+    sums = np.zeros((len(sum_columns), len(polygons)), dtype='float64')
+
+    for chunk in citations:
+        points = to_geodataframe(chunk[['latitude', 'longitude'] + sum_columns],
+                                 datetimes_to_str=False)
+        assigned = assign_polygons(points.geometry.values, index)
+        inside = assigned >= 0
+        counts += np.bincount(assigned[inside], minlength=len(polygons))
+        for i, column in enumerate(sum_columns):
+            values = points[column].values[inside].astype('float64')
+            values[np.isnan(values)] = 0
+            sums[i] += np.bincount(assigned[inside], weights=values, minlength=len(polygons))
+
+    aggregated = polygons.copy()
+    aggregated['citations'] = counts
+    for i, column in enumerate(sum_columns):
+        aggregated[column] = sums[i]
+    return aggregated
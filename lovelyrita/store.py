@@ -0,0 +1,234 @@
+import os
+import uuid
+from functools import partial
+import pandas as pd
+from lovelyrita.clean import clean as clean_data, impute_missing_times_chunks
+from lovelyrita.data import (iter_data, concat, get_arrow_schema, normalize_arrow_schema,
+                             to_arrow_table)
+from lovelyrita.profiler import Profiler
+from lovelyrita.utils import parallel_map
+
+# name of the partition holding citations without a datetime, read back as a null month
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def get_months(datetimes):
+    """Get the partition name of each datetime
+
+    Parameters
+    ----------
+    datetimes : pandas.Series of datetime
+
+    Returns
+    -------
+    A Series of str such as '2018-01', with `NULL_PARTITION` for missing datetimes
+    """
+    return datetimes.dt.strftime('%Y-%m').fillna(NULL_PARTITION)
+
+
+def _dataset(store_path):
+    import pyarrow.dataset
+    return pyarrow.dataset.dataset(store_path, format='parquet', partitioning='hive')
+
+
+def _filter(start=None, end=None):
+    import pyarrow.dataset
+    month = pyarrow.dataset.field('month')
+    expression = None
+    if start is not None:
+        expression = month >= start
+    if end is not None:
+        expression = month <= end if expression is None else expression & (month <= end)
+    return expression
+
+
+def get_ticket_numbers(store_path):
+    """Get the ticket numbers already in a store
+
+    Only the `ticket_number` column is read.
+
+    Parameters
+    ----------
+    store_path : str
+
+    Returns
+    -------
+    A pandas.Index of ticket numbers. Empty if the store does not exist.
+    """
+    if not os.path.isdir(store_path) or not os.listdir(store_path):
+        return pd.Index([], dtype=object)
+    table = _dataset(store_path).to_table(columns=['ticket_number'])
+    return pd.Index(table.column('ticket_number').to_pandas())
+
+
+def _drop_known(chunk, known):
+    """Drop rows whose ticket number has been seen, and add the rest to the seen numbers"""
+    chunk = chunk[chunk['ticket_number'].notnull()]
+    chunk = chunk[~chunk['ticket_number'].isin(known)]
+    chunk = chunk.drop_duplicates('ticket_number')
+    known.update(chunk['ticket_number'])
+    return chunk
+
+
+def update_store(store_path, paths, chunksize=100000, workers=None, profiler=None):
+    """Clean new citations from raw data files and add them to a store
+
+    A store is a directory of parquet files partitioned by the month of `ticket_issue_datetime`,
+    e.g., `store_path/month=2018-01/<part>.parquet`. Raw rows whose ticket number is already in
+    the store, or appeared earlier in the input, are dropped before cleaning, so only new
+    citations are cleaned and written. Each update adds at most one file to each month.
+
+    Parameters
+    ----------
+    store_path : str
+        Directory of the store, created if it does not exist
+    paths : list
+        A list of file paths to the raw data
+    chunksize : int
+        The number of rows to read at a time
+    workers : int
+        If provided, clean the chunks in this many worker processes
+    profiler : lovelyrita.profiler.Profiler
+        If provided, record the time and memory used by each cleaning stage and by writing.
+        Stages run in worker processes cannot be recorded, so the chunks are cleaned in this
+        process and `workers` is ignored.
+
+    Returns
+    -------
+    A tuple of the number of rows read and the number of new rows added
+    """
+    import pyarrow.parquet
+
+    known = set(get_ticket_numbers(store_path))
+    schema = None
+    if known:
+        schema = _dataset(store_path).schema
+        schema = normalize_arrow_schema(schema.remove(schema.get_field_index('month')))
+
+    n_read = [0]
+
+    def count(chunk):
+        n_read[0] += len(chunk)
+        return chunk
+
+    chunks = (_drop_known(count(chunk), known) for chunk in iter_data(paths, chunksize))
+    chunks = (chunk for chunk in chunks if len(chunk) > 0)
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+    else:
+        workers = None
+    # missing times are imputed from the new citations only
+    chunks = parallel_map(partial(clean_data, impute=False, profiler=profiler), chunks,
+                          workers=workers)
+    chunks = impute_missing_times_chunks(chunks, profiler=profiler)
+
+    part_name = '{}.parquet'.format(uuid.uuid4().hex)
+    writers = {}
+    n_added = 0
+    try:
+        for chunk in chunks:
+            # every group is converted before any of the chunk is written, so a chunk that
+            # does not fit the schema fails without writing part of it
+            with profiler.stage('write_store', chunk):
+                if schema is None:
+                    schema = get_arrow_schema(chunk)
+                months = get_months(chunk['ticket_issue_datetime'])
+                tables = [(month, to_arrow_table(group, schema))
+                          for month, group in chunk.groupby(months.values, sort=False)]
+
+                for month, table in tables:
+                    if month not in writers:
+                        directory = os.path.join(store_path, 'month={}'.format(month))
+                        if not os.path.exists(directory):
+                            os.makedirs(directory)
+                        writers[month] = pyarrow.parquet.ParquetWriter(
+                            os.path.join(directory, part_name), schema)
+                    writers[month].write_table(table)
+                    n_added += table.num_rows
+    except BaseException:
+        # remove the files of this update, so the store is as it was before
+        for month, writer in writers.items():
+            writer.close()
+            directory = os.path.join(store_path, 'month={}'.format(month))
+            os.remove(os.path.join(directory, part_name))
+            if not os.listdir(directory):
+                os.rmdir(directory)
+        raise
+    else:
+        for writer in writers.values():
+            writer.close()
+
+    return n_read[0], n_added
+
+
+def get_store_months(store_path):
+    """List the months in a store
+
+    Parameters
+    ----------
+    store_path : str
+
+    Returns
+    -------
+    A sorted list of str such as '2018-01'. Citations without a datetime are not included.
+    """
+    months = [name.split('=', 1)[1] for name in os.listdir(store_path)
+              if name.startswith('month=')]
+    return sorted(month for month in months if month != NULL_PARTITION)
+
+
+def load_store(store_path, columns=None, start=None, end=None):
+    """Load citations from a store
+
+    Only the files of the months between `start` and `end` are read.
+
+    Parameters
+    ----------
+    store_path : str
+    columns : list of str
+        If provided, only load these columns
+    start : str
+        First month to load, e.g., '2018-01'
+    end : str
+        Last month to load, inclusive
+
+    Returns
+    -------
+    A DataFrame. If `start` or `end` is given, citations without a datetime are excluded.
+    """
+    chunks = list(iter_store(store_path, columns=columns, start=start, end=end))
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return concat(chunks).reset_index(drop=True)
+
+
+def iter_store(store_path, chunksize=None, columns=None, start=None, end=None):
+    """Load citations from a store in chunks
+
+    Parameters
+    ----------
+    store_path : str
+    chunksize : int
+        The maximum number of rows in each chunk. If None, each file is one chunk.
+    columns : list of str
+        If provided, only load these columns
+    start : str
+        First month to load, e.g., '2018-01'
+    end : str
+        Last month to load, inclusive
+
+    Returns
+    -------
+    A generator of DataFrames
+    """
+    dataset = _dataset(store_path)
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != 'month']
+
+    expression = _filter(start, end)
+    for fragment in dataset.get_fragments(filter=expression):
+        if chunksize is None:
+            yield fragment.to_table(columns=columns).to_pandas()
+            continue
+        for batch in fragment.to_batches(columns=columns, batch_size=chunksize):
+            yield batch.to_pandas()
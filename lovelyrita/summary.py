@@ -0,0 +1,177 @@
+from __future__ import division
+import numpy as np
+import pandas as pd
+
+
+def _bit_length(values):
+    """Get the number of bits needed to represent each value of an array of uint64
+
+    The bit length is found by binary search with integer shifts, since converting to float
+    rounds values with more than 53 bits.
+    """
+    values = values.copy()
+    bit_lengths = np.zeros(len(values), dtype='int64')
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= np.uint64(2 ** shift)
+        values[high] >>= np.uint64(shift)
+        bit_lengths[high] += shift
+    return bit_lengths + (values > 0)
+
+
+class HyperLogLog(object):
+    def __init__(self, precision=14):
+        """Approximate count of distinct values, using a fixed amount of memory
+
+        The relative error is about 1.04 / sqrt(2 ** precision), i.e., about 1% for the default
+        precision, which uses 16 KB.
+
+        Parameters
+        ----------
+        precision : int
+            Number of bits of each hash used to choose a register, between 4 and 18
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18, not {}'.format(precision))
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype='uint8')
+
+    def update(self, values):
+        """Add values to the count
+
+        Parameters
+        ----------
+        values : pandas.Series
+        """
+        if len(values) == 0:
+            return
+
+        hashes = pd.util.hash_pandas_object(values, index=False).values
+        n_bits = 64 - self.precision
+        registers = (hashes >> np.uint64(n_bits)).astype('int64')
+
+        # the rank is the position of the leftmost 1 in the remaining bits
+        remaining = hashes & np.uint64(2 ** n_bits - 1)
+        ranks = n_bits - _bit_length(remaining) + 1
+
+        ranks = pd.Series(ranks).groupby(registers).max()
+        self.registers[ranks.index] = np.maximum(self.registers[ranks.index], ranks.values)
+
+    def merge(self, other):
+        """Add the values counted by another HyperLogLog with the same precision
+        """
+        self.registers = np.maximum(self.registers, other.registers)
+
+    def count(self):
+        """Return the estimated number of distinct values
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m ** 2 / np.sum(2. ** -self.registers.astype('float64'))
+
+        # use linear counting for small cardinalities
+        n_zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and n_zeros > 0:
+            estimate = m * np.log(m / n_zeros)
+
+        return int(round(estimate))
+
+
+class ColumnSummary(object):
+    def __init__(self, name, approximate=False):
+        """Summary statistics of a column, accumulated one chunk at a time
+
+        Parameters
+        ----------
+        name : str
+        approximate : bool
+            If True, count unique values with a HyperLogLog instead of keeping every unique value
+        """
+        self.name = name
+        self.dtype = None
+        self.n_rows = 0
+        self.n_null = 0
+        self.sample = None
+        self.uniques = HyperLogLog() if approximate else set()
+
+    def update(self, series):
+        """Add a chunk of the column to the summary
+
+        Parameters
+        ----------
+        series : pandas.Series
+        """
+        self.dtype = _common_dtype(self.dtype, series.dtype)
+        self.n_rows += len(series)
+
+        null = series.isnull().values
+        n_null = np.count_nonzero(null)
+        self.n_null += n_null
+        values = series[~null] if n_null > 0 else series
+
+        if isinstance(self.uniques, HyperLogLog):
+            self.uniques.update(values)
+            if self.sample is None and len(values) > 0:
+                self.sample = values.iloc[0]
+        else:
+            uniques = pd.unique(values)
+            if self.sample is None and len(uniques) > 0:
+                self.sample = uniques[0]
+            self.uniques.update(uniques)
+
+    @property
+    def unique_count(self):
+        # null values are counted as one unique value
+        if isinstance(self.uniques, HyperLogLog):
+            count = self.uniques.count()
+        else:
+            count = len(self.uniques)
+        return count + (self.n_null > 0)
+
+
+def _common_dtype(a, b):
+    if a is None or a == b or a.name == b.name:
+        return b
+    try:
+        return np.result_type(a, b)
+    except TypeError:
+        return np.dtype('object')
+
+
+def summarize(data, approximate=False):
+    """Generate a summary of the data in a DataFrame, or a sequence of DataFrames.
+
+    Each column of each DataFrame is passed over once, so the data can be streamed in chunks
+    (see `lovelyrita.data.iter_data`) without loading it all into memory.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame or iterable of pandas.DataFrame
+    approximate : bool
+        If True, estimate the number of unique values with a HyperLogLog, which uses a fixed
+        amount of memory per column
+
+    Returns
+    -------
+    A DataFrame containing the data type, number of unique values, a sample value, number and
+    percent of null values
+    """
+    if isinstance(data, pd.DataFrame):
+        data = [data, ]
+
+    summaries = {}
+    for chunk in data:
+        for column in chunk.columns:
+            if column not in summaries:
+                summaries[column] = ColumnSummary(column, approximate=approximate)
+            summaries[column].update(chunk[column])
+
+    column_report = []
+    for s in summaries.values():
+        pct_null = 100. * s.n_null / s.n_rows if s.n_rows > 0 else np.nan
+        column_report.append([s.name, s.dtype, s.unique_count, s.sample, s.n_null, pct_null])
+
+    columns = ["Column Name", "Data Type", "Unique Count", "Sample Value", "null", "% null"]
+    column_report = pd.DataFrame(column_report, columns=columns).round(2)
+    column_report.sort_values(by="null", inplace=True)
+
+    return column_report
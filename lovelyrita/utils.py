@@ -1,27 +1,109 @@
 from __future__ import print_function
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+from lovelyrita.summary import summarize
+
+
+def factorize(values):
+    """Encode values as integer codes into an array of unique values
+
+    Parameters
+    ----------
+    values : pandas.Series or pandas.DataFrame
+        Categorical series are not re-encoded; their codes and categories are used directly,
+        without the categories that do not appear. For a DataFrame, each unique row is a unique
+        value.
+
+    Returns
+    -------
+    A tuple of an array of codes, with nulls coded as -1, and the unique values
+    """
+    if isinstance(values, pd.DataFrame):
+        # combine the codes of each column into one code per unique row
+        codes = np.zeros(len(values), dtype='int64')
+        n_codes = 1
+        for column in values:
+            column_codes, column_uniques = factorize(values[column])
+            radix = len(column_uniques) + 1
+            if n_codes * radix >= 2 ** 63:
+                # renumber the codes so far from 0, so combining them does not overflow
+                codes, uniques = pd.factorize(codes)
+                n_codes = len(uniques)
+            codes = codes * radix + column_codes + 1
+            n_codes *= radix
+        codes, _ = pd.factorize(codes)
+        _, first_indices = np.unique(codes, return_index=True)
+        return codes, values.iloc[first_indices].reset_index(drop=True)
+
+    if values.dtype.name == 'category':
+        codes = np.asarray(values.cat.codes)
+        categories = values.cat.categories
+        # drop unused categories, e.g., those left after filtering, by renumbering the codes
+        used = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+        if used.all():
+            return codes, pd.Series(categories)
+        new_codes = np.cumsum(used) - 1
+        codes = np.where(codes >= 0, new_codes[codes], -1)
+        return codes, pd.Series(categories[used])
+
+    codes, uniques = pd.factorize(values)
+    return codes, pd.Series(uniques)
+
+
+def map_unique(values, function, categorical=None):
+    """Apply a function once to the unique values of a Series or DataFrame
+
+    The results are broadcast back to every row, so the cost of the function scales with the
+    number of unique values rather than the number of rows.
+
+    Parameters
+    ----------
+    values : pandas.Series or pandas.DataFrame
+    function : callable
+        Takes the unique values (with a default integer index) and returns a Series or DataFrame
+        indexed the same way. Rows missing from the output are null in the result.
+    categorical : bool
+        If True, text results are returned as categoricals, which avoids expanding them to one
+        string per row. Defaults to True if `values` is categorical.
+
+    Returns
+    -------
+    A Series or DataFrame with the same index as `values`
+    """
+    if categorical is None:
+        categorical = isinstance(values, pd.Series) and values.dtype.name == 'category'
+
+    codes, uniques = factorize(values)
+    result = function(uniques).reindex(pd.RangeIndex(len(uniques)))
+
+    if isinstance(result, pd.Series):
+        broadcast = _broadcast(result, codes, categorical).rename(result.name)
+    else:
+        broadcast = pd.DataFrame({column: _broadcast(result[column], codes, categorical)
+                                  for column in result}, columns=result.columns)
+
+    broadcast.index = values.index
+    return broadcast
+
+
+def _broadcast(uniques, codes, categorical):
+    if categorical and uniques.dtype.kind == 'O' and uniques.dtype.name != 'category':
+        # re-encode, since different unique values may have produced the same result
+        result_codes, categories = pd.factorize(uniques)
+        codes = np.where(codes >= 0, result_codes[codes], -1)
+        return pd.Series(pd.Categorical.from_codes(codes, categories))
+    return uniques.reindex(codes).reset_index(drop=True)
 
 
 def get_column_report(df):
     """Generate a summary of the data in a DataFrame
     """
-    column_report = []
-    for column in df.columns:
-        unique = df[column].unique()
-        sample = np.nan
-        for value in unique:
-            if value is not np.nan:
-                sample = value
-                break
-        nans = df[column].isnull().sum()
-        pct_nan = 100. * nans / df.shape[0]
-        column_report.append([column, df[column].dtype, len(unique), sample, nans, pct_nan])
-
-    columns = ["Column Name", "Data Type", "Unique Count",
-               "Sample Value", "NaNs", "% NaN"]
-    column_report = pd.DataFrame(column_report, columns=columns).round(2)
-    column_report.sort_values(by="NaNs", inplace=True)
+    column_report = summarize(df)
+    column_report.columns = ["Column Name", "Data Type", "Unique Count",
+                             "Sample Value", "NaNs", "% NaN"]
     return column_report
 
 
@@ -50,3 +132,58 @@ def output_addresses(df, file_out):
         for address in addresses:
             output.write(address + '\n')
     return addresses
+
+
+def parallel_map(function, iterable, workers=None):
+    """Apply a function to each item of an iterable in a pool of worker processes
+
+    Results are returned in the same order as the items. At most two items per worker are
+    pending at a time, so the iterable can be a generator of large objects.
+
+    Parameters
+    ----------
+    function : callable
+        Must be picklable, e.g., a module-level function or a functools.partial of one
+    iterable : iterable
+    workers : int
+        The number of worker processes. If None or 1, items are processed in this process.
+
+    Returns
+    -------
+    A generator of results
+    """
+    if workers is None or workers <= 1:
+        for item in iterable:
+            yield function(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def concat(dataframes):
+    """Concatenate DataFrames, keeping columns that are categorical in all of them categorical
+
+    Parameters
+    ----------
+    dataframes : list of pandas.DataFrame
+
+    Returns
+    -------
+    A DataFrame
+    """
+    if len(dataframes) > 1:
+        for column in dataframes[0].select_dtypes(include=['category']):
+            if not all(df[column].dtype.name == 'category' for df in dataframes):
+                continue
+            categories = union_categoricals([df[column] for df in dataframes]).categories
+            for df in dataframes:
+                df[column] = df[column].cat.set_categories(categories)
+
+    return pd.concat(dataframes)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_raw_citations(n_rows, first_ticket=0, n_streets=50, n_badges=20, seed=0,
+                       null_times=None):
+    """Make a DataFrame of raw citations, in order of time, as they appear in the raw csv files
+
+    Parameters
+    ----------
+    n_rows : int
+    first_ticket : int
+        Ticket number of the first citation
+    n_streets, n_badges : int
+        Number of distinct streets and badge numbers
+    null_times : array of int
+        Positions of the rows with a missing time. Defaults to a random tenth of the rows.
+
+    Returns
+    -------
+    A pandas.DataFrame
+    """
+    random = np.random.RandomState(seed)
+    datetimes = pd.Series(np.datetime64('2018-01-01T08:00') +
+                          np.sort(random.randint(0, 60 * 24 * 90, n_rows)).astype('m8[m]'))
+    times = datetimes.dt.strftime('%H:%M:%S')
+    if null_times is None:
+        null_times = random.rand(n_rows) < 0.1
+    times[null_times] = None
+    streets = np.array(['{} MAIN ST'.format(100 + i) for i in range(n_streets)], dtype=object)
+
+    return pd.DataFrame({
+        'ticket_number': np.arange(first_ticket, first_ticket + n_rows).astype(str),
+        'ticket_issue_date': datetimes.dt.strftime('%m/%d/%y').values,
+        'ticket_issue_time': times.values,
+        'street': streets[random.randint(0, n_streets, n_rows)],
+        'city': 'OAKLAND',
+        'state': 'CA',
+        'badge_number': (1000 + random.randint(0, n_badges, n_rows)).astype(str),
+        'fine_amount': '$45.00',
+        '[latitude]': 37.8,
+        '[longitude]': -122.2})
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    """Return a function that writes raw citations to a csv file and returns its path"""
+    def write(name='raw.csv', **kwargs):
+        path = str(tmp_path / name)
+        make_raw_citations(**kwargs).to_csv(path, index=False)
+        return path
+    return write
@@ -0,0 +1,66 @@
+import pandas as pd
+from lovelyrita import addresses
+from lovelyrita.addresses import normalize_addresses, replace
+
+
+def test_configured_replacements(monkeypatch):
+    streets = pd.Series(['ONE BLK MAIN ST', 'VOID12 MAIN ST'])
+
+    normalized, voided = normalize_addresses(streets)
+    assert normalized.iloc[0] != 'ONE BLK MAIN ST'
+    assert list(voided) == [False, True]
+
+    # an empty list of replacements disables them, in both functions
+    monkeypatch.setattr(addresses, 'ADDRESS_REPLACEMENTS', [])
+    normalized, voided = normalize_addresses(streets)
+    assert list(normalized) == ['ONE BLK MAIN ST', '12 MAIN ST']
+    assert list(replace(streets, inplace=False)) == list(streets)
+
+    monkeypatch.setattr(addresses, 'ADDRESS_REPLACEMENTS', [['MAIN', 'MAIN STREET']])
+    assert replace(streets, inplace=False).iloc[0] == 'ONE BLK MAIN STREET ST'
+    replace(streets)
+    assert streets.iloc[1] == 'VOID12 MAIN STREET ST'
+
+
+STREETS = ['123 MAIN ST', 'ONE BLK MAIN ST', 'TWO BLK BROADWAY', 'VOID123 MAIN ST',
+           'ZVOID1 BLK MAIN ST', 'VOIDZ#12 MAIN ST', 'ZVOIDZONE BLK OAK ST', '#45 OAK ST',
+           '5 -7 PARK ST', 'PIER 9 TERM', '100 BBLKK ELM ST', 'ONE', 'P12-1 PARK ST',
+           'CLOT CITY CENTER LOT', '1 BLKSTONE ST', 'MAIN ST TERM ', None, '123 MAIN ST']
+
+
+def chained_replace(streets):
+    """The replacements as they were made before normalize_addresses: remove the void marker,
+    then apply each default replacement in turn to the whole Series"""
+    voided = streets.str.contains(addresses.VOID_PATTERN, regex=True)
+    streets = streets.str.replace(addresses.VOID_PATTERN, '', regex=True)
+    for pattern, replacement in addresses.REPLACEMENTS:
+        streets = streets.replace(pattern, replacement, regex=True)
+    return streets, voided.fillna(False).astype(bool)
+
+
+def to_list(streets):
+    """The values of a Series of streets, with None for any missing value"""
+    streets = streets.astype(object)
+    return list(streets.where(streets.notnull(), None))
+
+
+def test_normalize_addresses_matches_chained_replacements(monkeypatch):
+    monkeypatch.setattr(addresses, 'ADDRESS_REPLACEMENTS', None)
+    streets = pd.Series(STREETS, dtype=object, name='street')
+    expected, expected_voided = chained_replace(streets)
+
+    normalized, voided = normalize_addresses(streets)
+    assert to_list(normalized) == to_list(expected)
+    assert list(voided) == list(expected_voided)
+    assert normalized.name == 'street'
+
+    # categorical streets give the same values
+    normalized, voided = normalize_addresses(streets.astype('category'))
+    assert to_list(normalized) == to_list(expected)
+    assert list(voided) == list(expected_voided)
+
+    # without the void pattern, as replace() does
+    expected = streets
+    for pattern, replacement in addresses.REPLACEMENTS:
+        expected = expected.replace(pattern, replacement, regex=True)
+    assert to_list(replace(streets, inplace=False)) == to_list(expected)
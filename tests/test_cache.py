@@ -0,0 +1,57 @@
+import time
+from lovelyrita.cache import GeocodeCache, is_failure
+
+
+def test_is_failure():
+    assert is_failure(None)
+    assert is_failure({'lat': None, 'lng': None})
+    assert is_failure((None, None, None))
+    assert not is_failure({'lat': 1., 'lng': None})
+
+
+def test_cache_failures_expire_separately(tmp_path, monkeypatch):
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite'), ttl=None, failure_ttl=10)
+    failure = {'lat': None, 'lng': None}
+    cache.set_many([('1 Main St', {'lat': 1., 'lng': 2.}), ('2 MAIN ST', failure)], 'test')
+
+    assert cache.get('1 MAIN  ST', 'test') == {'lat': 1., 'lng': 2.}
+    assert cache.get('2 main st', 'test') == failure
+    assert cache.get('3 MAIN ST', 'test') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'failures': 1, 'size': 1,
+                             'failures_size': 1}
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert cache.get('2 MAIN ST', 'test') is None
+    assert cache.get('1 MAIN ST', 'test') == {'lat': 1., 'lng': 2.}
+    assert cache.expire() == 1
+    assert cache.stats()['failures_size'] == 0
+
+
+def test_cache_result_replaces_failure(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite'))
+    cache.set('1 MAIN ST', 'test', {'lat': None})
+    cache.set('1 MAIN ST', 'test', {'lat': 1.})
+    assert cache.get('1 MAIN ST', 'test') == {'lat': 1.}
+    cache.set('1 MAIN ST', 'test', {'lat': None})
+    assert cache.get('1 MAIN ST', 'test') == {'lat': None}
+    assert len(cache) == 0
+
+    cache.clear()
+    assert cache.get('1 MAIN ST', 'test') is None
+
+
+def test_cache_without_failures(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite'), failure_ttl=0)
+    cache.set_many([('1 MAIN ST', {'lat': None}), ('2 MAIN ST', {'lat': 2.})], 'test')
+    assert cache.get('1 MAIN ST', 'test') is None
+    assert cache.get('2 MAIN ST', 'test') == {'lat': 2.}
+    assert cache.stats()['failures_size'] == 0
+
+
+def test_cache_failures_from_results_table(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite'), ttl=None, failure_ttl=0)
+    with cache.connection:
+        cache.connection.execute("""INSERT INTO geocodes VALUES ('test', '1 MAIN ST', ?, ?)""",
+                                 ('{"lat": null}', time.time()))
+    assert cache.get('1 MAIN ST', 'test') is None
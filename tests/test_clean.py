@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+import pytest
+from lovelyrita.clean import (convert_dollar_to_float, compact, clean, get_datetime,
+                              impute_missing_times)
+from lovelyrita.data import read_data, write_data, load_data
+from lovelyrita.schema import CATEGORICAL_COLUMNS
+
+
+def test_convert_dollar_to_float():
+    dollars = pd.Series(['$45.00', ' $1,234.50', '-$45.00', '($10.25)', None, '$45.00',
+                         '$-45.00', '$ 12'], index=list('abcdefgh'))
+
+    amounts = convert_dollar_to_float(dollars)
+
+    assert amounts.dtype == np.float32
+    assert amounts.index.equals(dollars.index)
+    np.testing.assert_array_equal(amounts.values, np.array([45, 1234.5, -45, -10.25, 0, 45,
+                                                            -45, 12], dtype='float32'))
+    assert dollars.iloc[0] == '$45.00'
+
+
+def test_convert_dollar_to_float_invalid():
+    dollars = pd.Series(['$45.00', 'N/A', '$4x5', None], name='fine_amount')
+    with pytest.warns(UserWarning, match='2 values of fine_amount'):
+        amounts = convert_dollar_to_float(dollars)
+    assert amounts.dtype == np.float32
+    assert amounts.iloc[0] == 45 and amounts.iloc[3] == 0
+    assert amounts.iloc[1:3].isnull().all()
+
+
+def test_convert_dollar_to_float_categorical():
+    dollars = pd.Series(['$45.00', None, '$25.00'], dtype='category')
+    amounts = convert_dollar_to_float(dollars)
+    assert amounts.dtype == np.float32
+    assert list(amounts) == [45, 0, 25]
+
+
+def test_convert_dollar_to_float_inplace_is_deprecated():
+    dollars = pd.Series(['$45.00'])
+    with pytest.warns(FutureWarning):
+        amounts = convert_dollar_to_float(dollars, inplace=False)
+    assert list(amounts) == [45]
+
+
+def test_compact():
+    dataframe = pd.DataFrame({
+        'state': ['CA', 'CA', 'NV', 'CA'],
+        'ticket_number': ['1', '2', '3', '4'],
+        'badge_number': pd.Categorical(['1', '2', '1', '1'], categories=['1', '2', '3']),
+        'count': np.array([1, 2, 3, 300], dtype='int64'),
+        'fine_amount': np.array([45.5, 25., np.nan, 1.25], dtype='float64'),
+        'ticket_id': np.array([16777217., 1., np.nan, 2.], dtype='float64'),
+        'small_id': np.array([1., 2., np.nan, 3.], dtype='float64'),
+        'voided': [False, True, False, False]})
+
+    compacted, memory = compact(dataframe, categorical_columns=['state'], report=True)
+
+    dtypes = compacted.dtypes.astype(str).to_dict()
+    assert dtypes['state'] == 'category'
+    assert dtypes['ticket_number'] != 'category'
+    assert list(compacted['badge_number'].cat.categories) == ['1', '2']
+    assert dtypes['count'] == 'int16'
+    assert dtypes['fine_amount'] == 'float32'
+    # whole numbers that float32 cannot hold exactly stay float64
+    assert dtypes['ticket_id'] == 'float64'
+    assert compacted['ticket_id'].iloc[0] == 16777217.
+    assert dtypes['small_id'] == 'float32'
+    assert dtypes['voided'] == 'bool'
+
+    assert list(memory.columns) == ['dtype before', 'dtype after', 'bytes before',
+                                    'bytes after', 'bytes saved']
+    assert list(memory.index) == list(dataframe.columns)
+    assert memory.loc['count', 'dtype before'] == 'int64'
+    assert memory.loc['count', 'dtype after'] == 'int16'
+    assert memory.loc['count', 'bytes saved'] == 4 * 6
+    assert memory.loc['ticket_id', 'bytes saved'] == 0
+    assert (memory['bytes saved'] == memory['bytes before'] - memory['bytes after']).all()
+
+
+def test_compact_infers_categorical_columns():
+    dataframe = pd.DataFrame({'state': ['CA'] * 3 + ['NV'], 'ticket_number': list('1234')})
+    compacted = compact(dataframe)
+    assert compacted['state'].dtype.name == 'category'
+    assert compacted['ticket_number'].dtype.name != 'category'
+
+
+def test_clean_keeps_categorical_columns(raw_csv, tmp_path):
+    citations = clean(read_data(raw_csv(n_rows=200)))
+    categorical = [column for column in CATEGORICAL_COLUMNS if column in citations]
+    assert categorical
+    for column in categorical:
+        assert citations[column].dtype.name == 'category', column
+
+    for name in ['clean.parquet', 'clean.feather']:
+        path = str(tmp_path / name)
+        write_data(citations, path)
+        loaded = load_data(path)
+        for column in categorical:
+            assert loaded[column].dtype.name == 'category', (name, column)
+        pd.testing.assert_frame_equal(loaded.reset_index(drop=True),
+                                      citations.reset_index(drop=True), check_categorical=False)
+
+
+def test_get_datetime_mixed_formats():
+    dataframe = pd.DataFrame({
+        'ticket_issue_date': ['01/02/18', '2018-01-03', '01/04/18', None, 'soon', '2018-01-05'],
+        'ticket_issue_time': ['08:00:00', '09:30', '10:15', '11:00', '12:00', '25:99']})
+
+    with pytest.warns(UserWarning) as record:
+        datetimes, invalid = get_datetime(dataframe, return_invalid=True)
+
+    expected = pd.to_datetime(['2018-01-02 08:00', '2018-01-03 09:30', '2018-01-04 10:15',
+                               None, None, None])
+    assert list(datetimes) == list(expected)
+    assert list(invalid) == [False, False, False, False, True, True]
+    messages = sorted(str(warning.message) for warning in record)
+    assert messages[0].startswith('1 values of ticket_issue_date')
+    assert messages[1].startswith('1 values of ticket_issue_time')
+
+
+def test_clean_does_not_impute_invalid_datetimes(raw_csv):
+    raw = read_data(raw_csv(n_rows=10))
+    raw['ticket_issue_time'] = ['08:00:00', None, '10:00:00', 'noon', '12:00:00', None,
+                                '14:00:00', '15:00:00', '16:00:00', '17:00:00']
+    raw['ticket_issue_date'] = '01/02/18'
+
+    with pytest.warns(UserWarning, match='1 values of ticket_issue_time'):
+        citations = clean(raw)
+
+    datetimes = citations['ticket_issue_datetime']
+    # the missing times are imputed, and the time that was not recognized is left missing
+    assert datetimes.iloc[1] == pd.Timestamp('2018-01-02 09:00')
+    assert pd.isnull(datetimes.iloc[3])
+    assert datetimes.iloc[5] == pd.Timestamp('2018-01-02 13:00')
+    assert list(citations['invalid_datetime']) == [False] * 3 + [True] + [False] * 6
+
+
+def test_impute_missing_times():
+    datetimes = pd.Series(pd.to_datetime([None, '2018-01-01 08:00', None, None, '2018-01-01 08:03',
+                                          None, '2018-01-01 09:00', None]), index=list('abcdefgh'))
+
+    imputed = impute_missing_times(datetimes, inplace=False)
+
+    # interior gaps are spread evenly between their neighbours; leading and trailing gaps stay
+    expected = pd.to_datetime([None, '2018-01-01 08:00:00', '2018-01-01 08:01:00',
+                               '2018-01-01 08:02:00', '2018-01-01 08:03:00',
+                               '2018-01-01 08:31:30', '2018-01-01 09:00:00', None])
+    assert list(imputed) == list(expected)
+    assert imputed.index.equals(datetimes.index)
+    assert datetimes.isnull().sum() == 5
+
+    impute_missing_times(datetimes)
+    assert list(datetimes) == list(expected)
+
+
+def test_impute_missing_times_all_or_one_valid():
+    datetimes = pd.Series(pd.to_datetime([None, '2018-01-01 08:00', None]))
+    assert impute_missing_times(datetimes, inplace=False).isnull().sum() == 2
+    datetimes = pd.Series(pd.to_datetime([None, None]))
+    assert impute_missing_times(datetimes, inplace=False).isnull().all()
+
+
+def test_impute_missing_times_timezone():
+    # the gap spans a daylight saving change, so it is interpolated in UTC
+    datetimes = pd.Series(pd.to_datetime(['2018-03-11 01:00', None, '2018-03-11 04:00'])
+                          .tz_localize('US/Pacific'))
+
+    imputed = impute_missing_times(datetimes, inplace=False)
+
+    assert imputed.dt.tz == datetimes.dt.tz
+    assert imputed.iloc[1] == pd.Timestamp('2018-03-11 10:00', tz='UTC')
+    assert str(imputed.iloc[1]) == '2018-03-11 03:00:00-07:00'
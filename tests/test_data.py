@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from lovelyrita.clean import clean, clean_chunks
+from lovelyrita.data import (iter_data, read_data, write_chunks, load_data, write_data,
+                             to_geodataframe)
+from lovelyrita.utils import concat
+
+
+def test_write_chunks_parquet_with_growing_categories(raw_csv, tmp_path):
+    # the first chunk has fewer than 128 badge numbers, later chunks add more
+    path = raw_csv(n_rows=2000, n_badges=400)
+    out_path = str(tmp_path / 'clean.parquet')
+
+    n_rows = write_chunks(iter_data(path, 100, clean=True), out_path)
+
+    citations = load_data(out_path)
+    assert len(citations) == n_rows == 2000
+    assert citations['badge_number'].dtype.name == 'category'
+    assert citations['badge_number'].nunique() > 127
+    expected = pd.read_csv(path, dtype=str)['badge_number']
+    assert (citations['badge_number'].astype(str).values == expected.values).all()
+
+
+def test_geoparquet_round_trip_keeps_crs(tmp_path):
+    citations = pd.DataFrame({'ticket_number': ['1', '2', '3'],
+                              'latitude': [37.8, 0., 37.7], 'longitude': [-122.2, 0., -122.3]})
+    path = str(tmp_path / 'citations.geoparquet')
+
+    geodataframe = to_geodataframe(citations, copy=True)
+    assert geodataframe.crs.to_epsg() == 4326
+    write_data(geodataframe, path)
+
+    loaded = load_data(path)
+    assert loaded.crs.to_epsg() == 4326
+    assert list(loaded['ticket_number']) == ['1', '3']
+
+
+def assert_same_citations(left, right):
+    pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True),
+                                  check_categorical=False)
+
+
+def make_null_times(n_rows):
+    # runs of missing times at the start, across the chunk boundaries at 100 and 300, filling
+    # the chunk from 200 to 300, and at the end
+    null_times = np.r_[0:3, 95:110, 195:305, 350:351]
+    return np.r_[null_times[null_times < n_rows - 4], n_rows - 4:n_rows]
+
+
+def test_iter_data_clean_matches_clean(raw_csv):
+    path = raw_csv(n_rows=500, null_times=make_null_times(500))
+    expected = clean(read_data(path))
+
+    chunks = list(iter_data(path, 100, clean=True))
+
+    assert len(chunks) > 1
+    citations = concat(chunks)
+    assert_same_citations(citations, expected)
+    # only the leading and trailing missing times are left missing
+    assert citations['ticket_issue_datetime'].isnull().sum() == 3 + 4
+
+
+def test_clean_chunks_matches_clean(raw_csv):
+    path = raw_csv(n_rows=500, null_times=make_null_times(500))
+    expected = clean(read_data(path))
+    raw = read_data(path)
+
+    chunks = clean_chunks(raw.iloc[start:start + 100].copy() for start in range(0, 500, 100))
+
+    assert_same_citations(concat(list(chunks)), expected)
+
+
+def test_parallel_cleaning_matches_serial(raw_csv):
+    paths = [raw_csv('first.csv', n_rows=300, null_times=make_null_times(300)),
+             raw_csv('second.csv', n_rows=200, first_ticket=300, seed=1)]
+
+    # each file is cleaned on its own, so missing times are not imputed across files
+    expected = concat([clean(read_data(path)) for path in paths])
+    assert_same_citations(read_data(paths, clean=True), expected)
+    assert_same_citations(read_data(paths, clean=True, workers=2), expected)
+    assert_same_citations(concat(list(iter_data(paths, 100, clean=True))), expected)
+    assert_same_citations(concat(list(iter_data(paths, 100, clean=True, workers=2))), expected)
@@ -0,0 +1,495 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+import pytest
+import psycopg2
+from psycopg2.extensions import QueryCanceledError
+from lovelyrita.cache import GeocodeCache
+from lovelyrita.geocode import (AsyncGeocoder, PostGISGeocoder, PooledPostGISGeocoder,
+                                POSTGIS_POOL_SIZE, GazetteerGeocoder, geocode_citations,
+                                geocode_blocks,
+                                load_gazetteer, _edit_distance, _trigrams)
+from lovelyrita.addresses import parse_address, normalize_street_name
+
+
+class StubServer(object):
+    """A stub of the Google Maps API, in a thread
+
+    The first request for each address is refused with HTTP 429, addresses starting with
+    'UNKNOWN' get ZERO_RESULTS, and the most requests handled at once is recorded.
+    """
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                address = parse_qs(urlparse(self.path).query)['address'][0]
+                with stub.lock:
+                    first = address not in stub.requests
+                    stub.requests.append(address)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.in_flight -= 1
+
+                if first:
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+                if address.startswith('UNKNOWN'):
+                    content = {'status': 'ZERO_RESULTS', 'results': []}
+                else:
+                    content = {'status': 'OK', 'results': [{
+                        'place_id': 'id-' + address,
+                        'geometry': {'location': {'lat': float(len(address)), 'lng': -1.}}}]}
+                body = json.dumps(content).encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    with StubServer() as server:
+        yield server
+
+
+def make_geocoder(server, **kwargs):
+    kwargs = dict(dict(rate=1000, concurrency=4, backoff=0.01), **kwargs)
+    return AsyncGeocoder(api_url=server.url, api_key='key', **kwargs)
+
+
+def test_async_geocoder_retries_429_and_keeps_order(server):
+    geocoder = make_geocoder(server)
+    addresses = ['{} MAIN ST'.format(i) for i in range(20)] + ['UNKNOWN ST', '0 MAIN ST']
+
+    results = geocoder.geocode_many(addresses)
+
+    assert len(results) == len(addresses)
+    for address, result in zip(addresses[:20], results):
+        assert result == (float(len(address)), -1., 'id-' + address)
+    assert results[20] == (None, None, None)
+    assert results[21] == results[0]
+    # each address is requested twice, the first time refused with 429
+    assert len(server.requests) == 2 * 21
+    assert server.max_in_flight <= 4
+
+
+def test_async_geocoder_gives_up_after_retries(server):
+    geocoder = make_geocoder(server, retries=0)
+    assert geocoder.geocode_many(['1 MAIN ST']) == [(None, None, None)]
+    assert len(server.requests) == 1
+
+
+def test_async_geocoder_in_running_event_loop(server, tmp_path):
+    # the cache is opened in this thread, and used from the thread running the requests
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite'))
+    cache.set('3 MAIN ST', AsyncGeocoder.backend, {'lat': 3., 'lng': -3., 'place_id': 'id-3',
+                                                   'timestamp': ''})
+    geocoder = make_geocoder(server, cache=cache)
+
+    async def main():
+        return geocoder.geocode_many(['1 MAIN ST', '2 MAIN ST', '3 MAIN ST'])
+
+    assert asyncio.run(main()) == [(9., -1., 'id-1 MAIN ST'), (9., -1., 'id-2 MAIN ST'),
+                                   (3., -3., 'id-3')]
+    assert '3 MAIN ST' not in server.requests
+    assert cache.get('1 MAIN ST', AsyncGeocoder.backend)['place_id'] == 'id-1 MAIN ST'
+    assert cache.stats()['hits'] == 2
+
+
+class StubCursor(object):
+    """A DB-API cursor that geocodes addresses as PostGIS would, returning rows out of order"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, parameters=()):
+        self.connection.queries.append((query, parameters))
+        if not query.startswith('SELECT'):
+            return
+        addresses = parameters[0]
+        self.rows = []
+        for i, address in enumerate(addresses, 1):
+            if address.startswith('UNKNOWN'):
+                self.rows.append((i, ) + (None, ) * 9)
+            else:
+                number, street = address.split(' ', 1)
+                self.rows.append((i, 0, -float(number), float(number), number, street, 'ST',
+                                  'OAKLAND', 'CA', '94612'))
+        self.rows.reverse()
+
+    def fetchall(self):
+        return self.rows
+
+
+class StubConnection(object):
+    def __init__(self):
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+def expected_result(address):
+    number, street = address.split(' ', 1)
+    return {'rating': 0, 'longitude': -float(number), 'latitude': float(number),
+            'street_number': number, 'street_name': street, 'street_suffix': 'ST'}
+
+
+def test_postgis_geocode_many_with_connection():
+    connection = StubConnection()
+    geocoder = PostGISGeocoder(connection=connection, batch_size=3)
+    addresses = ['{} MAIN'.format(i) for i in range(1, 8)]
+    addresses[4] = 'UNKNOWN MAIN'
+
+    results = geocoder.geocode_many(addresses)
+
+    # batches of 3 addresses, each in a single query on the given connection
+    assert [len(parameters[0]) for query, parameters in connection.queries] == [3, 3, 1]
+    assert results[4] == dict.fromkeys(PostGISGeocoder.columns)
+    for i, address in enumerate(addresses):
+        if i != 4:
+            assert results[i] == expected_result(address)
+    assert geocoder.geocode('12 MAIN') == expected_result('12 MAIN')
+
+
+class BrokenConnection(StubConnection):
+    """A connection that is lost as soon as it is queried"""
+    def cursor(self):
+        cursor = StubCursor(self)
+
+        def execute(query, parameters=()):
+            if query.startswith('SELECT'):
+                raise psycopg2.OperationalError('server closed the connection unexpectedly')
+            StubCursor.execute(cursor, query, parameters)
+        cursor.execute = execute
+        return cursor
+
+
+class SlowConnection(StubConnection):
+    """A connection that counts how many connections are queried at once"""
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def cursor(self):
+        cursor = StubCursor(self)
+
+        def execute(query, parameters=()):
+            cls = SlowConnection
+            with cls.lock:
+                cls.in_flight += 1
+                cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            time.sleep(0.005)
+            StubCursor.execute(cursor, query, parameters)
+            with cls.lock:
+                cls.in_flight -= 1
+        cursor.execute = execute
+        return cursor
+
+
+def pooled_geocoder(connections, **kwargs):
+    connections = iter(connections)
+    opened = []
+
+    def connect():
+        opened.append(next(connections))
+        return opened[-1]
+    return PooledPostGISGeocoder(connect=connect, **kwargs), opened
+
+
+def test_pooled_postgis_reconnects_broken_connection():
+    geocoder, opened = pooled_geocoder([BrokenConnection(), StubConnection()], pool_size=1,
+                                       timeout=2.5)
+
+    assert geocoder.geocode_many(['1 MAIN', '2 MAIN']) == [expected_result('1 MAIN'),
+                                                           expected_result('2 MAIN')]
+    broken, connection = opened
+    assert broken.closed and not connection.closed
+    # the new connection is back in the pool, with the timeout set, and is reused
+    assert list(geocoder.pool.queue) == [connection]
+    assert connection.autocommit
+    assert connection.queries[0] == ('SET statement_timeout = %s', (2500, ))
+    assert geocoder.geocode('3 MAIN') == expected_result('3 MAIN')
+    assert len(opened) == 2
+
+    geocoder.close()
+    assert connection.closed
+    assert list(geocoder.pool.queue) == [None]
+
+
+def test_pooled_postgis_gives_up_after_retries():
+    geocoder, opened = pooled_geocoder([BrokenConnection() for _ in range(3)], pool_size=1,
+                                       retries=2)
+    with pytest.raises(psycopg2.OperationalError):
+        geocoder.geocode('1 MAIN')
+    assert len(opened) == 3 and all(connection.closed for connection in opened)
+    # the pool still has a slot, so the next query opens a new connection
+    assert list(geocoder.pool.queue) == [None]
+
+
+def test_pooled_postgis_retries_cancelled_batch_one_at_a_time():
+    class CancellingConnection(StubConnection):
+        def cursor(self):
+            cursor = StubCursor(self)
+
+            def execute(query, parameters=()):
+                StubCursor.execute(cursor, query, parameters)
+                if query.startswith('SELECT') and (len(parameters[0]) > 1 or
+                                                   parameters[0][0] == '2 MAIN'):
+                    raise QueryCanceledError('canceling statement due to statement timeout')
+            cursor.execute = execute
+            return cursor
+
+    geocoder, opened = pooled_geocoder([CancellingConnection()], pool_size=1, timeout=1)
+    results = geocoder.geocode_many(['1 MAIN', '2 MAIN', '3 MAIN'])
+    assert results == [expected_result('1 MAIN'), dict.fromkeys(PostGISGeocoder.columns),
+                       expected_result('3 MAIN')]
+    assert len(opened) == 1
+
+
+def test_pooled_postgis_pool_size():
+    assert PooledPostGISGeocoder(connect=StubConnection).pool_size == POSTGIS_POOL_SIZE
+
+    SlowConnection.max_in_flight = 0
+    geocoder, opened = pooled_geocoder([SlowConnection() for _ in range(10)], pool_size=3,
+                                       batch_size=2)
+    addresses = ['{} MAIN'.format(i) for i in range(1, 41)]
+    assert geocoder.geocode_many(addresses) == [expected_result(a) for a in addresses]
+    assert len(opened) <= 3
+    assert SlowConnection.max_in_flight <= 3
+
+
+class CountingGeocoder(object):
+    """A geocoder that records the addresses it is asked for, and fails on the `fail_on`th batch"""
+    columns = ['lat', 'lng', 'place_id']
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.batches = []
+
+    def geocode_many(self, addresses):
+        self.batches.append(list(addresses))
+        if len(self.batches) == self.fail_on:
+            raise RuntimeError('connection lost')
+        return [(float(len(address)), -float(len(address)), 'id-' + address)
+                for address in addresses]
+
+
+def test_geocode_citations_resumes_from_checkpoint(tmp_path):
+    citations = pd.DataFrame({'street': ['{} MAIN ST'.format(i % 23) for i in range(100)],
+                              'city': 'OAKLAND', 'state': 'CA'},
+                             index=pd.RangeIndex(1000, 1100))
+    checkpoint_path = str(tmp_path / 'checkpoint.csv')
+    expected = geocode_citations(citations, CountingGeocoder(), batch_size=5,
+                                 progress=lambda n_done, n_total: None)
+
+    geocoder = CountingGeocoder(fail_on=3)
+    with pytest.raises(RuntimeError):
+        geocode_citations(citations, geocoder, checkpoint_path=checkpoint_path, batch_size=5,
+                          progress=lambda n_done, n_total: None)
+    finished = set(sum(geocoder.batches[:2], []))
+    checkpoint = pd.read_csv(checkpoint_path, index_col=0)
+    assert checkpoint.index.is_unique and len(checkpoint) > 0
+
+    geocoder = CountingGeocoder()
+    results = geocode_citations(citations, geocoder, checkpoint_path=checkpoint_path,
+                                batch_size=5, progress=lambda n_done, n_total: None)
+
+    # the finished batches are not geocoded again, and every citation has one result
+    geocoded = sum(geocoder.batches, [])
+    assert not finished & set(geocoded)
+    assert len(finished) + len(geocoded) == 23
+    assert results.index.equals(citations.index)
+    pd.testing.assert_frame_equal(results, expected)
+    checkpoint = pd.read_csv(checkpoint_path, index_col=0)
+    assert sorted(checkpoint.index) == list(citations.index)
+
+
+def test_trigrams_and_edit_distance():
+    assert _trigrams('AB') == {'  A', ' AB', 'AB '}
+    assert _edit_distance('MAIN', 'MAIN') == 0
+    assert _edit_distance('MAIN', 'MIAN') == 1
+    assert _edit_distance('MAIN', 'MAN') == 1
+    assert _edit_distance('', 'ABC') == 3
+    assert _edit_distance('KITTEN', 'SITTING') == 3
+
+
+def test_parse_address():
+    assert parse_address('123 MAIN ST, OAKLAND, CA') == ('123', 'MAIN ST')
+    assert parse_address('P12-1 PARK ST, OAKLAND, CA') == ('12-1', 'PARK ST')
+    # the prefix must be the initial of a word of the street name
+    assert parse_address('X12-1 PARK ST') is None
+    assert parse_address('CLOT CITY CENTER LOT') is None
+    assert parse_address(None) is None
+    assert normalize_street_name('Park  Street') == 'PARK ST'
+
+
+class StubFallback(object):
+    columns = ['lat', 'lng', 'place_id']
+
+    def __init__(self):
+        self.addresses = []
+
+    def geocode_many(self, addresses):
+        self.addresses.extend(addresses)
+        return [(1., 2., 'id') if address.startswith('9') else (None, None, None)
+                for address in addresses]
+
+
+def make_gazetteer(fallback=None):
+    points = pd.DataFrame({'street_number': [100., 102., np.nan, 12., 104.],
+                           'street_name': ['Main Street', 'MAIN ST', 'MAIN ST', 'PARK ST', None],
+                           'latitude': [37.1, 37.2, 37.3, 37.4, 37.5],
+                           'longitude': [-122.1, -122.2, -122.3, -122.4, -122.5]})
+    return GazetteerGeocoder(points, fallback=fallback)
+
+
+def test_gazetteer_geocoder():
+    fallback = StubFallback()
+    geocoder = make_gazetteer(fallback)
+    # points without a number or name are skipped
+    assert geocoder.streets == {'MAIN ST': {'100': (37.1, -122.1), '102': (37.2, -122.2)},
+                                'PARK ST': {'12': (37.4, -122.4)}}
+
+    results = geocoder.geocode_many(['100 MAIN ST, OAKLAND, CA', '102 MAIM ST, OAKLAND, CA',
+                                     'P12-1 PARK ST, OAKLAND, CA', '900 ELM ST, OAKLAND, CA',
+                                     '104 MAIN ST, OAKLAND, CA'])
+
+    assert results[0] == {'latitude': 37.1, 'longitude': -122.1, 'street_number': '100',
+                          'street_name': 'MAIN ST', 'match': 'exact'}
+    assert results[1]['match'] == 'fuzzy' and results[1]['latitude'] == 37.2
+    # the space number of a parking lot space falls back to the lot number
+    assert results[2]['match'] == 'exact' and results[2]['street_number'] == '12'
+    assert results[3] == {'latitude': 1., 'longitude': 2., 'street_number': None,
+                          'street_name': None, 'match': 'fallback'}
+    assert results[4] == dict.fromkeys(GazetteerGeocoder.columns)
+    assert fallback.addresses == ['900 ELM ST, OAKLAND, CA', '104 MAIN ST, OAKLAND, CA']
+    assert geocoder.stats == {'exact': 2, 'fuzzy': 1, 'fallback': 1, 'miss': 1}
+
+
+def test_gazetteer_fuzzy_match_threshold():
+    geocoder = make_gazetteer()
+    assert geocoder.match_street_name('MAIN ST') == ('MAIN ST', False)
+    assert geocoder.match_street_name('MAIM ST') == ('MAIN ST', True)
+    assert geocoder.match_street_name('ELM ST') is None
+    assert geocoder.geocode('100 ELM ST') == dict.fromkeys(GazetteerGeocoder.columns)
+
+
+def test_load_gazetteer(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    pd.DataFrame({'NUM': [100, None], 'STREET': ['MAIN ST', 'PARK ST'], 'latitude': [37.1, 37.2],
+                  'longitude': [-122.1, -122.2], 'other': [1, 2]}).to_csv(path, index=False)
+
+    points = load_gazetteer(path, column_map={'street_number': 'NUM', 'street_name': 'STREET'})
+    assert list(points.columns) == ['street_number', 'street_name', 'latitude', 'longitude']
+    assert GazetteerGeocoder(points).geocode('100 MAIN ST')['latitude'] == 37.1
+
+
+class BlockGeocoder(object):
+    """A geocoder that knows the location of some streets, and records the addresses asked for"""
+    columns = ['latitude', 'longitude']
+    locations = {'100 MAIN ST': (1.0, 10.), '150 MAIN ST': (1.5, 15.),
+                 '101 MAIN ST': (2.0, 20.), '131 MAIN ST': (2.3, 23.),
+                 '200 ELM ST': (3.0, 30.), '300 OAK ST': (4.0, 40.),
+                 'CLOT CITY CENTER LOT': (5.0, 50.)}
+
+    def __init__(self):
+        self.addresses = []
+
+    def geocode_many(self, addresses):
+        self.addresses.extend(addresses)
+        return [self.locations.get(address.split(',')[0], (None, None))
+                for address in addresses]
+
+
+def make_block_citations():
+    streets = ['100 MAIN ST', '120 MAIN ST', '150 MAIN ST', '101 MAIN ST', '111 MAIN ST',
+               '131 MAIN ST', '200 ELM ST', '210 ELM ST', '220 ELM ST', '400 PINE ST',
+               '410 PINE ST', '300 OAK ST', 'CLOT CITY CENTER LOT', 'MLOT MONTCLAIR LOT',
+               '120 MAIN ST']
+    return pd.DataFrame({'street': streets, 'city': 'OAKLAND', 'state': 'CA'},
+                        index=range(100, 100 + len(streets)))
+
+
+def test_geocode_blocks():
+    citations = make_block_citations()
+    geocoder = BlockGeocoder()
+
+    located = geocode_blocks(citations, geocoder, progress=lambda n_done, n_total: None)
+
+    assert located.index.equals(citations.index)
+    expected = [
+        # both ends of the even side of the block are geocoded, and 120 is in between
+        (1.0, 10., 'geocoded'), (1.2, 12., 'interpolated'), (1.5, 15., 'geocoded'),
+        # the odd side is a separate block face
+        (2.0, 20., 'geocoded'), (2.1, 21., 'interpolated'), (2.3, 23., 'geocoded'),
+        # the high end fails, so the low end is used for the block face
+        (3.0, 30., 'geocoded'), (3.0, 30., 'block'), (3.0, 30., 'block'),
+        # neither end is found
+        (np.nan, np.nan, None), (np.nan, np.nan, None),
+        # a block face with a single number
+        (4.0, 40., 'geocoded'),
+        # addresses that cannot be parsed are geocoded as they are
+        (5.0, 50., 'geocoded'), (np.nan, np.nan, None),
+        (1.2, 12., 'interpolated')]
+    latitude, longitude, quality = zip(*expected)
+    np.testing.assert_allclose(located['latitude'].values.astype(float), latitude)
+    np.testing.assert_allclose(located['longitude'].values.astype(float), longitude)
+    assert list(located['quality']) == list(quality)
+
+    # only the ends of the block faces and the unparsed addresses are geocoded
+    streets = sorted(address.split(',')[0] for address in geocoder.addresses)
+    assert streets == sorted(['100 MAIN ST', '150 MAIN ST', '101 MAIN ST', '131 MAIN ST',
+                              '200 ELM ST', '220 ELM ST', '400 PINE ST', '410 PINE ST',
+                              '300 OAK ST', 'CLOT CITY CENTER LOT', 'MLOT MONTCLAIR LOT'])
+
+
+def test_geocode_blocks_checkpoint(tmp_path):
+    citations = make_block_citations()
+    checkpoint_path = str(tmp_path / 'checkpoint.csv')
+    expected = geocode_blocks(citations, BlockGeocoder(), checkpoint_path=checkpoint_path,
+                              progress=lambda n_done, n_total: None)
+
+    geocoder = BlockGeocoder()
+    located = geocode_blocks(citations, geocoder, checkpoint_path=checkpoint_path,
+                             progress=lambda n_done, n_total: None)
+    pd.testing.assert_frame_equal(located, expected)
+    assert geocoder.addresses == []
+
+    # the checkpoint holds addresses, not citations, so geocode_citations cannot resume it
+    with pytest.raises(ValueError, match='checkpoint'):
+        geocode_citations(citations, geocoder, checkpoint_path=checkpoint_path,
+                          progress=lambda n_done, n_total: None)
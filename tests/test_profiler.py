@@ -0,0 +1,55 @@
+import tracemalloc
+import numpy as np
+import pytest
+from lovelyrita.profiler import Profiler
+
+
+def test_stage_records_rows_and_memory():
+    profiler = Profiler()
+    with profiler.stage('allocate') as stage:
+        array = np.ones(2 ** 20)
+        stage['rows_out'] = len(array)
+        del array
+
+    stage, = profiler.report()
+    assert stage['calls'] == 1 and stage['rows_out'] == 2 ** 20
+    assert stage['peak_memory'] >= 8 * 2 ** 20
+    assert not tracemalloc.is_tracing()
+
+
+def test_nested_stages_keep_the_outer_peak():
+    profiler = Profiler()
+    with profiler.stage('outer'):
+        array = np.ones(2 ** 20)
+        del array
+        with profiler.stage('inner'):
+            assert tracemalloc.is_tracing()
+        assert tracemalloc.is_tracing()
+
+    stages = {stage['stage']: stage for stage in profiler.report()}
+    assert stages['outer']['peak_memory'] >= 8 * 2 ** 20
+    assert not tracemalloc.is_tracing()
+
+
+def test_failed_stage_stops_tracing():
+    profiler = Profiler()
+    with pytest.raises(ValueError):
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                raise ValueError()
+
+    assert profiler.report() == []
+    assert not tracemalloc.is_tracing()
+    with profiler.stage('next'):
+        pass
+    assert [stage['stage'] for stage in profiler.report()] == ['next']
+
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        with Profiler().stage('stage'):
+            pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import geopandas
+from shapely.geometry import box, Point
+from lovelyrita.spatial import build_index, assign_polygons, aggregate_by_polygon
+
+
+def make_polygons():
+    return geopandas.GeoDataFrame({'name': ['a', 'b']},
+                                  geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs='epsg:4326')
+
+
+def test_assign_polygons():
+    polygons = make_polygons()
+    # inside a, on the edge shared by a and b, inside b, outside both, on the outer edge of b
+    points = [Point(0.5, 0.5), Point(1.0, 0.5), Point(1.5, 0.5), Point(5, 5), Point(2.0, 0.2)]
+    assigned = assign_polygons(np.array(points, dtype=object), build_index(polygons))
+    assert list(assigned) == [0, 0, 1, -1, 1]
+
+
+def test_aggregate_by_polygon():
+    polygons = make_polygons()
+    citations = pd.DataFrame({'latitude': [0.5, 0.5, 0.5, 5., 0.],
+                              'longitude': [0.5, 1.0, 1.5, 5., 0.],
+                              'fine_amount': [10., 20., 30., 40., 50.]})
+    chunks = [citations.iloc[:2], citations.iloc[2:]]
+
+    aggregated = aggregate_by_polygon(chunks, polygons)
+
+    # the point on the shared edge goes to the first polygon, and latitude 0 is not geocoded
+    assert list(aggregated['citations']) == [2, 1]
+    assert list(aggregated['fine_amount']) == [30., 30.]
+    assert list(aggregated['name']) == ['a', 'b']
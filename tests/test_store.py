@@ -0,0 +1,55 @@
+import os
+import pytest
+from lovelyrita import store
+from lovelyrita.profiler import Profiler
+from lovelyrita.store import update_store, load_store
+
+
+def test_update_store_with_different_cardinality(raw_csv, tmp_path):
+    store_path = str(tmp_path / 'store')
+    # the first extract has few badge numbers, the second has more than fit in int8 indices
+    first = raw_csv('first.csv', n_rows=500, n_badges=10)
+    second = raw_csv('second.csv', n_rows=2000, first_ticket=400, n_badges=400, seed=1)
+
+    assert update_store(store_path, [first], chunksize=100) == (500, 500)
+    assert update_store(store_path, [second], chunksize=100) == (2000, 1900)
+
+    citations = load_store(store_path)
+    assert len(citations) == 2400
+    assert citations['ticket_number'].is_unique
+    assert citations['badge_number'].nunique() > 127
+
+
+def test_update_store_failure_leaves_store_unchanged(raw_csv, tmp_path, monkeypatch):
+    store_path = str(tmp_path / 'store')
+    update_store(store_path, [raw_csv('first.csv', n_rows=500)], chunksize=100)
+    files = sorted(os.walk(store_path))
+
+    calls = []
+
+    def to_arrow_table(dataframe, schema):
+        calls.append(1)
+        if len(calls) > 3:
+            raise ValueError('failed')
+        return original(dataframe, schema)
+
+    original = store.to_arrow_table
+    monkeypatch.setattr(store, 'to_arrow_table', to_arrow_table)
+    second = raw_csv('second.csv', n_rows=2000, first_ticket=500, seed=1)
+    with pytest.raises(ValueError):
+        update_store(store_path, [second], chunksize=100)
+
+    assert sorted(os.walk(store_path)) == files
+    assert len(load_store(store_path)) == 500
+
+
+def test_update_store_with_profiler(raw_csv, tmp_path):
+    profiler = Profiler()
+    update_store(str(tmp_path / 'store'), [raw_csv(n_rows=500)], chunksize=100, workers=2,
+                 profiler=profiler)
+
+    stages = {stage['stage']: stage for stage in profiler.report()}
+    assert stages['write_store']['calls'] == 5
+    assert stages['write_store']['rows_in'] == 500
+    assert stages['drop_null']['calls'] == 5
+    assert 'impute_missing_times' in stages
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+from lovelyrita.summary import HyperLogLog, _bit_length
+
+
+def test_bit_length():
+    values = np.array([0, 1, 2, 3, 2 ** 53 + 1, 2 ** 54 - 1, 2 ** 63, 2 ** 64 - 1],
+                      dtype='uint64')
+    assert list(_bit_length(values)) == [int(v).bit_length() for v in values]
+
+
+@pytest.mark.parametrize('precision', [4, 8, 10, 14, 18])
+def test_hyperloglog_count(precision):
+    values = pd.Series(np.arange(50000)).astype(str)
+    hll = HyperLogLog(precision)
+    hll.update(values)
+    hll.update(values[:1000])
+
+    error = 1.04 / np.sqrt(2 ** precision)
+    assert abs(hll.count() / 50000. - 1) < 4 * error
+
+
+def test_hyperloglog_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from lovelyrita.utils import factorize, map_unique
+
+
+def test_factorize_categorical_drops_unused_categories():
+    values = pd.Series(pd.Categorical(['b', None, 'd', 'b'], categories=['a', 'b', 'c', 'd']))
+    codes, uniques = factorize(values)
+    assert list(codes) == [0, -1, 1, 0]
+    assert list(uniques) == ['b', 'd']
+
+
+def test_map_unique_categorical_only_maps_used_categories():
+    values = pd.Series(pd.Categorical(['b', None, 'd', 'b'], categories=['a', 'b', 'c', 'd']))
+    seen = []
+
+    def function(uniques):
+        seen.extend(uniques)
+        return uniques.str.upper()
+
+    result = map_unique(values, function)
+    assert seen == ['b', 'd']
+    assert result.dtype.name == 'category'
+    assert list(result.astype(object).fillna('-')) == ['B', '-', 'D', 'B']
+
+
+def test_map_unique_dataframe():
+    values = pd.DataFrame({'a': ['x', 'y', 'x'], 'b': [1, 2, 1]})
+    result = map_unique(values, lambda uniques: uniques['a'] + uniques['b'].astype(str))
+    assert list(result) == ['x1', 'y2', 'x1']
+    assert result.index.equals(values.index)
+    assert np.all(result.values == np.array(['x1', 'y2', 'x1'], dtype=object))
+
+
+
+def test_factorize_dataframe_with_many_combinations():
+    # five columns of 2 ** 16 - 1 unique values each, so the combined codes do not fit in int64.
+    # Without renumbering, the first and last rows, which differ only in the first column, would
+    # get the same code.
+    n_uniques = 2 ** 16 - 1
+    values = pd.DataFrame({column: np.r_[np.arange(n_uniques), 0] for column in 'abcde'})
+    values.loc[n_uniques, 'a'] = 1
+
+    codes, uniques = factorize(values)
+
+    assert codes[0] != codes[-1]
+    assert len(uniques) == len(values)
+    pd.testing.assert_frame_equal(uniques.iloc[codes].reset_index(drop=True), values)